@@ -1,17 +1,29 @@
 # ai_router.py
 import os
+import json
+import base64
 import httpx
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
-from database import get_db
+from database import get_db, SessionLocal
+from llm_scheduler import scheduler, Overloaded
 import models
 import schemas
 
 OLLAMA_URL = os.getenv("OLLAMA_URL", "http://127.0.0.1:11434")
 DEFAULT_MODEL = os.getenv("OLLAMA_MODEL", "llama3")
 MAX_HISTORY = 16  # how many past messages to send to the model
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "3000"))  # and at most this many tokens
+# "batched": write user + assistant message in one transaction after the reply
+# "immediate": save the user message before calling the model (kept even if the model fails)
+CHAT_PERSIST_MODE = os.getenv("CHAT_PERSIST_MODE", "batched")
 
 router = APIRouter(prefix="/ai", tags=["ai"])
 
@@ -21,36 +33,166 @@ async def call_ollama_chat(messages, model: str):
     """
     url = f"{OLLAMA_URL}/api/chat"
     payload = {"model": model or DEFAULT_MODEL, "messages": messages, "stream": False}
-    async with httpx.AsyncClient(timeout=120) as client:
+    async with scheduler.slot(payload["model"], "interactive"), httpx.AsyncClient(timeout=120) as client:
         r = await client.post(url, json=payload)
         r.raise_for_status()
         data = r.json()
         # Ollama /api/chat returns {"message": {"role": "...", "content": "..."}, ...}
         return data["message"]["content"]
 
-@router.get("/conversations", response_model=List[schemas.ConversationOut])
-def list_conversations(db: Session = Depends(get_db)):
-    return db.query(models.Conversation).order_by(models.Conversation.id.desc()).all()
+async def stream_ollama_chat(messages, model: str):
+    """
+    Same as call_ollama_chat but with "stream": True; yields content chunks
+    from Ollama's NDJSON stream as they arrive.
+    """
+    url = f"{OLLAMA_URL}/api/chat"
+    payload = {"model": model or DEFAULT_MODEL, "messages": messages, "stream": True}
+    async with scheduler.slot(payload["model"], "interactive"), httpx.AsyncClient(timeout=120) as client:
+        async with client.stream("POST", url, json=payload) as r:
+            r.raise_for_status()
+            async for line in r.aiter_lines():
+                if not line.strip():
+                    continue
+                data = json.loads(line)
+                chunk = (data.get("message") or {}).get("content") or ""
+                if chunk:
+                    yield chunk
+                if data.get("done"):
+                    break
+
+def overloaded_error(e: Overloaded) -> HTTPException:
+    """Shed by the scheduler -> 429 with Retry-After."""
+    return HTTPException(
+        status_code=429,
+        detail=f"Model busy, retry in {e.retry_after:.0f}s",
+        headers={"Retry-After": str(int(e.retry_after + 0.999))},
+    )
+
+def char_token_count(text: str) -> int:
+    """Cheap token estimate (~4 chars per token)."""
+    return (len(text) + 3) // 4
 
-@router.get("/messages/{conversation_id}", response_model=List[schemas.MessageOut])
-def list_messages(conversation_id: int, db: Session = Depends(get_db)):
-    conv = db.get(models.Conversation, conversation_id)
-    if not conv:
+# pluggable: any callable str -> int (e.g. a tiktoken/HF tokenizer's len(encode(text)))
+count_tokens = char_token_count
+
+def fit_history(msgs, budget: int = HISTORY_TOKEN_BUDGET):
+    """
+    Keep the newest messages whose combined size fits the token budget.
+    The latest message (the user's question) is always kept.
+    """
+    kept, used = [], 0
+    for m in reversed(msgs):
+        cost = count_tokens(m["content"]) + 4  # + role/format overhead
+        if kept and used + cost > budget:
+            break
+        kept.append(m)
+        used += cost
+    return kept[::-1]
+
+def conversation_cursor(conv) -> str:
+    """Opaque next_cursor: urlsafe base64 of JSON [last_message_at ISO, id]."""
+    raw = json.dumps([conv.last_message_at.isoformat(), conv.id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def parse_conversation_cursor(cursor: str):
+    """conversation_cursor() -> (datetime, id)"""
+    try:
+        ts, conv_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return datetime.fromisoformat(ts), int(conv_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@router.get("/conversations", response_model=schemas.PaginatedConversations)
+def list_conversations(
+    limit: int = Query(30, ge=1, le=200),
+    before: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    db: Session = Depends(get_db),
+):
+    """Most recently active first, keyset-paginated on (last_message_at, id)."""
+    Conv = models.Conversation
+    stmt = select(Conv)
+    if before:
+        ts, conv_id = parse_conversation_cursor(before)
+        stmt = stmt.where(or_(Conv.last_message_at < ts, and_(Conv.last_message_at == ts, Conv.id < conv_id)))
+    rows = list(db.scalars(stmt.order_by(Conv.last_message_at.desc(), Conv.id.desc()).limit(limit + 1)))
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = conversation_cursor(rows[-1])
+    return {"items": rows, "limit": limit, "next_cursor": next_cursor}
+
+@router.get("/messages/{conversation_id}", response_model=schemas.MessagePage, response_model_exclude_none=True)
+def list_messages(
+    conversation_id: int,
+    limit: int = Query(50, ge=1, le=500),
+    before_id: Optional[int] = Query(None, description="older messages than this id (prev_cursor)"),
+    after_id: Optional[int] = Query(None, description="only messages newer than this id (incremental refresh)"),
+    db: Session = Depends(get_db),
+):
+    """
+    Default / before_id: the latest `limit` messages (before before_id), oldest first,
+    with prev_cursor set when older ones exist.
+    after_id: messages since that id in ascending order, with next_cursor set when more remain.
+    """
+    if before_id is not None and after_id is not None:
+        raise HTTPException(status_code=400, detail="Use either before_id or after_id")
+    if not db.scalar(select(models.Conversation.id).where(models.Conversation.id == conversation_id)):
         raise HTTPException(status_code=404, detail="Conversation not found")
-    return (
-        db.query(models.Message)
-        .filter(models.Message.conversation_id == conversation_id)
-        .order_by(models.Message.id.asc())
-        .all()
+
+    Msg = models.Message
+    stmt = select(Msg).where(Msg.conversation_id == conversation_id)
+    page = {"limit": limit}
+    if after_id is not None:
+        rows = list(db.scalars(stmt.where(Msg.id > after_id).order_by(Msg.id.asc()).limit(limit + 1)))
+        if len(rows) > limit:
+            rows = rows[:limit]
+            page["next_cursor"] = rows[-1].id
+    else:
+        if before_id is not None:
+            stmt = stmt.where(Msg.id < before_id)
+        rows = list(db.scalars(stmt.order_by(Msg.id.desc()).limit(limit + 1)))
+        if len(rows) > limit:
+            rows = rows[:limit]
+            page["prev_cursor"] = rows[-1].id
+        rows.reverse()
+    page["items"] = rows
+    return page
+
+def touch_conversation(db: Session, conv_id: int, added: int = 1):
+    """
+    Bump the denormalized message_count / last_message_at (same transaction as the insert).
+    The timestamp comes from Python, like the column default, so every stored value has
+    the format the "before" cursor is bound with (SQLite's CURRENT_TIMESTAMP does not).
+    """
+    db.execute(
+        update(models.Conversation)
+        .where(models.Conversation.id == conv_id)
+        .values(message_count=models.Conversation.message_count + added, last_message_at=models.utcnow())
     )
 
-@router.post("/chat", response_model=schemas.ChatOut, status_code=status.HTTP_201_CREATED)
-async def chat(body: schemas.ChatIn, db: Session = Depends(get_db)):
+def recent_history(db: Session, conv_id: int, limit: int = MAX_HISTORY):
+    """
+    Last `limit` messages of a conversation, oldest first, as plain dicts.
+    Reads only role/content via ORDER BY id DESC LIMIT on the
+    (conversation_id, id) index, so the cost doesn't grow with the conversation.
+    """
+    rows = db.execute(
+        select(models.Message.role, models.Message.content)
+        .where(models.Message.conversation_id == conv_id)
+        .order_by(models.Message.id.desc())
+        .limit(limit)
+    ).all()
+    return [{"role": r.role, "content": r.content} for r in reversed(rows)]
+
+def conversation_title(message: str) -> str:
+    return message.strip().split("\n", 1)[0][:80] or "New Conversation"
+
+def start_turn(body: schemas.ChatIn, db: Session):
+    """Get/create the conversation, save the user message, return (conv_id, history)."""
     # 1) get or create conversation
     conv_id = body.conversation_id
     if conv_id is None:
-        title = body.message.strip().split("\n", 1)[0][:80] or "New Conversation"
-        conv = models.Conversation(title=title)
+        conv = models.Conversation(title=conversation_title(body.message))
         db.add(conv); db.commit(); db.refresh(conv)
         conv_id = conv.id
     else:
@@ -60,24 +202,118 @@ async def chat(body: schemas.ChatIn, db: Session = Depends(get_db)):
 
     # 2) save user message
     user_msg = models.Message(conversation_id=conv_id, role="user", content=body.message)
-    db.add(user_msg); db.commit(); db.refresh(user_msg)
+    db.add(user_msg); touch_conversation(db, conv_id); db.commit(); db.refresh(user_msg)
 
     # 3) build history for model
-    history_q = (
-        db.query(models.Message)
-        .filter(models.Message.conversation_id == conv_id)
-        .order_by(models.Message.id.asc())
-    )
-    msgs = [{"role": m.role, "content": m.content} for m in history_q][-MAX_HISTORY:]
+    msgs = fit_history(recent_history(db, conv_id))
+    return conv_id, msgs
+
+def read_turn(body: schemas.ChatIn, db: Session):
+    """Batched mode: only read (conversation check + history); nothing is written before the reply."""
+    history = []
+    if body.conversation_id is not None:
+        if not db.scalar(select(models.Conversation.id).where(models.Conversation.id == body.conversation_id)):
+            raise HTTPException(status_code=404, detail="Conversation not found")
+        history = recent_history(db, body.conversation_id, MAX_HISTORY - 1)
+    msgs = fit_history(history + [{"role": "user", "content": body.message}])
+    return body.conversation_id, msgs
 
-    # 4) call Ollama
+def save_turn(db: Session, conv_id: Optional[int], user_text: str, reply_text: str) -> schemas.ChatOut:
+    """Batched mode: conversation (if new), user + assistant messages and counters in one transaction."""
+    try:
+        if conv_id is None:
+            conv = models.Conversation(title=conversation_title(user_text))
+            db.add(conv); db.flush()
+            conv_id = conv.id
+        asst_msg = models.Message(conversation_id=conv_id, role="assistant", content=reply_text)
+        db.add_all([models.Message(conversation_id=conv_id, role="user", content=user_text), asst_msg])
+        touch_conversation(db, conv_id, added=2)
+        db.flush(); db.refresh(asst_msg)  # created_at comes from the server
+        out = schemas.ChatOut(conversation_id=conv_id, assistant_message=asst_msg)
+        db.commit()
+    except IntegrityError:
+        # conversation deleted while the model was generating
+        db.rollback()
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    return out
+
+def begin_turn(body: schemas.ChatIn):
+    """
+    Runs before the model call in its own short-lived session, so no pool
+    connection stays checked out while the model generates. Returns (conv_id, history).
+    """
+    with SessionLocal() as db:
+        if CHAT_PERSIST_MODE == "immediate":
+            return start_turn(body, db)
+        return read_turn(body, db)
+
+def finish_turn(body: schemas.ChatIn, conv_id: Optional[int], reply_text: str) -> schemas.ChatOut:
+    """Runs after the model call, again in a short-lived session."""
+    with SessionLocal() as db:
+        if CHAT_PERSIST_MODE != "immediate":
+            return save_turn(db, conv_id, body.message, reply_text)
+        asst_msg = models.Message(conversation_id=conv_id, role="assistant", content=reply_text)
+        db.add(asst_msg); touch_conversation(db, conv_id); db.commit(); db.refresh(asst_msg)
+        return schemas.ChatOut(conversation_id=conv_id, assistant_message=asst_msg)
+
+@router.post("/chat", response_model=schemas.ChatOut, status_code=status.HTTP_201_CREATED)
+async def chat(body: schemas.ChatIn):
+    # shed before begin_turn writes anything (the user message in immediate mode)
+    try:
+        scheduler.check_admission(body.model or DEFAULT_MODEL, "interactive")
+    except Overloaded as e:
+        raise overloaded_error(e)
+    conv_id, msgs = await run_in_threadpool(begin_turn, body)
+
+    # 4) call Ollama (no DB connection held)
     try:
         reply_text = await call_ollama_chat(msgs, body.model or DEFAULT_MODEL)
+    except Overloaded as e:
+        raise overloaded_error(e)
     except httpx.HTTPError as e:
         raise HTTPException(status_code=502, detail=f"Ollama error: {e}")
 
-    # 5) save assistant message
-    asst_msg = models.Message(conversation_id=conv_id, role="assistant", content=reply_text)
-    db.add(asst_msg); db.commit(); db.refresh(asst_msg)
+    # 5) save the turn
+    return await run_in_threadpool(finish_turn, body, conv_id, reply_text)
+
+@router.post("/chat/stream")
+async def chat_stream(body: schemas.ChatIn):
+    """
+    Streaming version of /ai/chat (NDJSON): one {"token": "..."} line per chunk,
+    then a final {"done": true, "conversation_id": ..., "assistant_message": {...}}
+    after the full reply is saved.
+    """
+    # shed before the stream starts, while a 429 can still be returned
+    try:
+        scheduler.check_admission(body.model or DEFAULT_MODEL, "interactive")
+    except Overloaded as e:
+        raise overloaded_error(e)
+    conv_id, msgs = await run_in_threadpool(begin_turn, body)
+
+    async def ndjson_stream():
+        parts = []
+        try:
+            async for chunk in stream_ollama_chat(msgs, body.model or DEFAULT_MODEL):
+                parts.append(chunk)
+                yield json.dumps({"token": chunk}) + "\n"
+        except Overloaded as e:
+            yield json.dumps({"error": str(e), "retry_after": e.retry_after}) + "\n"
+            return
+        except httpx.HTTPError as e:
+            yield json.dumps({"error": f"Ollama error: {e}"}) + "\n"
+            return
+
+        # 5) save the turn
+        try:
+            out = await run_in_threadpool(finish_turn, body, conv_id, "".join(parts))
+        except HTTPException as e:
+            yield json.dumps({"error": e.detail}) + "\n"
+            return
+        yield json.dumps({"done": True, **out.model_dump(mode="json")}) + "\n"
+
+    return StreamingResponse(ndjson_stream(), media_type="application/x-ndjson")
 
-    return schemas.ChatOut(conversation_id=conv_id, assistant_message=asst_msg)
+@router.get("/scheduler")
+def scheduler_metrics():
+    """Per-model slots in use, queue lengths and queue waits by priority class."""
+    return scheduler.metrics()
@@ -0,0 +1,159 @@
+# async_router.py
+# Same authors/books endpoints as main.py, but on the async engine end-to-end
+# (AsyncSession, no threadpool hop). Mounted under /async when DB_ASYNC=true so
+# both paths can be benchmarked side by side against the same database.
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import get_async_db
+from pagination import parse_fields, keyset_page_async, cached_count_async
+import cache
+from writes import (
+    constraint_errors_async, insert_row_async, update_row_async, delete_row_async,
+)
+import models
+import schemas
+
+router = APIRouter(prefix="/async", tags=["async"])
+
+
+async def author_exists(db: AsyncSession, author_id: int) -> bool:
+    return await cache.get_entity_async(db, "author", models.Author, schemas.AuthorOut, author_id) is not None
+
+
+# -------------------- AUTHORS --------------------
+@router.post("/authors", response_model=schemas.AuthorOut, status_code=status.HTTP_201_CREATED)
+async def create_author(payload: schemas.AuthorCreate, db: AsyncSession = Depends(get_async_db)):
+    async with constraint_errors_async(db):
+        author = await insert_row_async(db, models.Author, payload.model_dump())
+        await db.commit()
+    return author
+
+@router.get("/authors", response_model=schemas.PaginatedAuthors, response_model_exclude_unset=True)
+async def list_authors(
+    limit: int = Query(10, ge=1, le=100),
+    after_id: Optional[int] = Query(None, description="next_cursor from the previous page"),
+    fields: Optional[str] = Query(None, description="comma-separated columns, e.g. first_name,email"),
+    include_total: bool = False,
+    db: AsyncSession = Depends(get_async_db),
+):
+    cols = parse_fields(models.Author, fields)
+    items, next_cursor = await keyset_page_async(db, models.Author, limit, after_id, cols)
+    page = {"items": items, "limit": limit, "next_cursor": next_cursor}
+    if include_total:
+        page["total"] = await cached_count_async(db, models.Author)
+    return page
+
+
+@router.get("/authors/{author_id}", response_model=schemas.AuthorOut)
+async def get_author(
+    author_id: int,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
+):
+    entry = await cache.get_entity_async(db, "author", models.Author, schemas.AuthorOut, author_id)
+    if not entry:
+        raise HTTPException(status_code=404, detail="Author not found")
+    return cache.cached_response(entry, response, if_none_match)
+
+
+@router.put("/authors/{author_id}", response_model=schemas.AuthorOut)
+async def update_author(author_id: int, payload: schemas.AuthorUpdate, db: AsyncSession = Depends(get_async_db)):
+    async with constraint_errors_async(db):
+        author = await update_row_async(db, models.Author, author_id, payload.model_dump(exclude_unset=True))
+        await db.commit()
+    if not author:
+        raise HTTPException(status_code=404, detail="Author not found")
+    await cache.invalidate_async("author", author_id)
+    return author
+
+
+@router.delete("/authors/{author_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_author(author_id: int, db: AsyncSession = Depends(get_async_db)):
+    async with constraint_errors_async(db, fk_detail="Cannot delete author with associated books"):
+        deleted = await delete_row_async(db, models.Author, author_id)
+        await db.commit()
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Author not found")
+    await cache.invalidate_async("author", author_id)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+@router.get("/authors/{author_id}/books", response_model=schemas.PaginatedBooks, response_model_exclude_unset=True)
+async def books_by_author(
+    author_id: int,
+    limit: int = Query(50, ge=1, le=500),
+    after_id: Optional[int] = Query(None, description="next_cursor from the previous page"),
+    fields: Optional[str] = Query(None, description="comma-separated columns, e.g. title,isbn"),
+    include_total: bool = False,
+    db: AsyncSession = Depends(get_async_db),
+):
+    if not await author_exists(db, author_id):
+        raise HTTPException(status_code=404, detail="Author not found")
+    cols = parse_fields(models.Book, fields)
+    filters = (models.Book.author_id == author_id,)
+    items, next_cursor = await keyset_page_async(db, models.Book, limit, after_id, cols, filters)
+    page = {"items": items, "limit": limit, "next_cursor": next_cursor}
+    if include_total:
+        page["total"] = await cached_count_async(db, models.Book, filters, key=("author", author_id))
+    return page
+
+
+# -------------------- BOOKS --------------------
+@router.post("/books", response_model=schemas.BookOut, status_code=status.HTTP_201_CREATED)
+async def create_book(payload: schemas.BookCreate, db: AsyncSession = Depends(get_async_db)):
+    async with constraint_errors_async(db):
+        book = await insert_row_async(db, models.Book, payload.model_dump())
+        await db.commit()
+    return book
+
+@router.get("/books", response_model=schemas.PaginatedBooks, response_model_exclude_unset=True)
+async def list_books(
+    limit: int = Query(50, ge=1, le=500),
+    after_id: Optional[int] = Query(None, description="next_cursor from the previous page"),
+    fields: Optional[str] = Query(None, description="comma-separated columns, e.g. title,isbn"),
+    include_total: bool = False,
+    db: AsyncSession = Depends(get_async_db),
+):
+    cols = parse_fields(models.Book, fields)
+    items, next_cursor = await keyset_page_async(db, models.Book, limit, after_id, cols)
+    page = {"items": items, "limit": limit, "next_cursor": next_cursor}
+    if include_total:
+        page["total"] = await cached_count_async(db, models.Book)
+    return page
+
+
+@router.get("/books/{book_id}", response_model=schemas.BookOut)
+async def get_book(
+    book_id: int,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
+):
+    entry = await cache.get_entity_async(db, "book", models.Book, schemas.BookOut, book_id)
+    if not entry:
+        raise HTTPException(status_code=404, detail="Book not found")
+    return cache.cached_response(entry, response, if_none_match)
+
+
+@router.put("/books/{book_id}", response_model=schemas.BookOut)
+async def update_book(book_id: int, payload: schemas.BookUpdate, db: AsyncSession = Depends(get_async_db)):
+    async with constraint_errors_async(db):
+        book = await update_row_async(db, models.Book, book_id, payload.model_dump(exclude_unset=True))
+        await db.commit()
+    if not book:
+        raise HTTPException(status_code=404, detail="Book not found")
+    await cache.invalidate_async("book", book_id)
+    return book
+
+
+@router.delete("/books/{book_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_book(book_id: int, db: AsyncSession = Depends(get_async_db)):
+    deleted = await delete_row_async(db, models.Book, book_id)
+    await db.commit()
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Book not found")
+    await cache.invalidate_async("book", book_id)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,187 @@
+# bench_writes.py
+# Counts SQL statements (and time) per write request: the old check-then-write
+# handlers vs the constraint-based ones in main.py. Both are called directly
+# with a session, so only the database work is compared.
+#
+#   python bench_writes.py                       # throwaway SQLite file
+#   DATABASE_URL=mysql+pymysql://... python bench_writes.py
+import os
+import sys
+import tempfile
+import time
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+
+from fastapi import HTTPException
+from sqlalchemy import event
+
+from database import SessionLocal, engine  # turns SQLite foreign keys on for every connection
+import main
+import models
+import schemas
+
+ROUNDS = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+MISSING_ID = 2_000_000_000  # author id that never exists
+
+counter = {"statements": 0}
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def _count_statement(*args):
+    counter["statements"] += 1
+
+
+@event.listens_for(engine, "commit")
+def _count_commit(*args):
+    counter["statements"] += 1
+
+
+# -------------------- OLD HANDLERS (before constraint-based writes) --------------------
+def legacy_create_author(payload: schemas.AuthorCreate, db):
+    exists = db.query(models.Author).filter(models.Author.email == payload.email).first()
+    if exists:
+        raise HTTPException(status_code=400, detail="Email already registered")
+    author = models.Author(**payload.model_dump())
+    db.add(author)
+    db.commit()
+    db.refresh(author)
+    return author
+
+
+def legacy_update_author(author_id: int, payload: schemas.AuthorUpdate, db):
+    author = db.get(models.Author, author_id)
+    if not author:
+        raise HTTPException(status_code=404, detail="Author not found")
+    if payload.email and payload.email != author.email:
+        exists = db.query(models.Author).filter(models.Author.email == payload.email).first()
+        if exists:
+            raise HTTPException(status_code=400, detail="Email already registered")
+    for k, v in payload.model_dump(exclude_unset=True).items():
+        setattr(author, k, v)
+    db.commit()
+    db.refresh(author)
+    return author
+
+
+def legacy_create_book(payload: schemas.BookCreate, db):
+    if not db.get(models.Author, payload.author_id):
+        raise HTTPException(status_code=400, detail="Author does not exist")
+    exists = db.query(models.Book).filter(models.Book.isbn == payload.isbn).first()
+    if exists:
+        raise HTTPException(status_code=400, detail="ISBN already exists")
+    book = models.Book(**payload.model_dump())
+    db.add(book)
+    db.commit()
+    db.refresh(book)
+    return book
+
+
+def legacy_update_book(book_id: int, payload: schemas.BookUpdate, db):
+    book = db.get(models.Book, book_id)
+    if not book:
+        raise HTTPException(status_code=404, detail="Book not found")
+    if payload.isbn and payload.isbn != book.isbn:
+        exists = db.query(models.Book).filter(models.Book.isbn == payload.isbn).first()
+        if exists:
+            raise HTTPException(status_code=400, detail="ISBN already exists")
+    if payload.author_id and not db.get(models.Author, payload.author_id):
+        raise HTTPException(status_code=400, detail="Author does not exist")
+    for k, v in payload.model_dump(exclude_unset=True).items():
+        setattr(book, k, v)
+    db.commit()
+    db.refresh(book)
+    return book
+
+
+def legacy_delete_book(book_id: int, db):
+    book = db.get(models.Book, book_id)
+    if not book:
+        raise HTTPException(status_code=404, detail="Book not found")
+    db.delete(book)
+    db.commit()
+
+
+def legacy_delete_author(author_id: int, db):
+    author = db.get(models.Author, author_id)
+    if not author:
+        raise HTTPException(status_code=404, detail="Author not found")
+    has_books = db.query(models.Book).filter(models.Book.author_id == author_id).first()
+    if has_books:
+        raise HTTPException(status_code=400, detail="Cannot delete author with associated books")
+    db.delete(author)
+    db.commit()
+
+
+IMPLEMENTATIONS = {
+    "legacy": {
+        "create_author": legacy_create_author, "update_author": legacy_update_author,
+        "create_book": legacy_create_book, "update_book": legacy_update_book,
+        "delete_book": legacy_delete_book, "delete_author": legacy_delete_author,
+    },
+    "current": {
+        "create_author": main.create_author, "update_author": main.update_author,
+        "create_book": main.create_book, "update_book": main.update_book,
+        "delete_book": main.delete_book, "delete_author": main.delete_author,
+    },
+}
+
+
+# -------------------- WORKLOAD --------------------
+def measure(results: dict, op: str, fn, *args, expect: int = None):
+    """Run one handler call; `expect` is the HTTP error status it must fail with."""
+    db = SessionLocal()
+    before = counter["statements"]
+    start = time.perf_counter()
+    status_code = None
+    try:
+        fn(*args, db=db)
+    except HTTPException as e:
+        status_code = e.status_code
+    finally:
+        elapsed = time.perf_counter() - start
+        db.close()
+    if status_code != expect:
+        raise AssertionError(f"{fn.__name__} ({op}): expected {expect or 'success'}, got {status_code or 'success'}")
+    stats = results.setdefault(op, [0, 0, 0.0])
+    stats[0] += 1
+    stats[1] += counter["statements"] - before
+    stats[2] += elapsed
+
+
+def run(name: str, impl: dict) -> dict:
+    results: dict = {}
+    for i in range(ROUNDS):
+        email = f"{name}-{i}@example.com"
+        measure(results, "create_author", impl["create_author"],
+                schemas.AuthorCreate(first_name="Ada", last_name="Bench", email=email))
+        measure(results, "create_author (duplicate email)", impl["create_author"],
+                schemas.AuthorCreate(first_name="Ada", last_name="Bench", email=email), expect=400)
+        with SessionLocal() as db:
+            author_id = db.query(models.Author.id).filter(models.Author.email == email).scalar()
+        measure(results, "create_book", impl["create_book"],
+                schemas.BookCreate(title="Bench", isbn=f"{name}-{i}", publication_year=2000,
+                                   available_copies=1, author_id=author_id))
+        measure(results, "create_book (unknown author)", impl["create_book"],
+                schemas.BookCreate(title="Bench", isbn=f"{name}-{i}-orphan", publication_year=2000,
+                                   available_copies=1, author_id=MISSING_ID), expect=400)
+        with SessionLocal() as db:
+            book_id = db.query(models.Book.id).filter(models.Book.isbn == f"{name}-{i}").scalar()
+        measure(results, "update_author", impl["update_author"], author_id,
+                schemas.AuthorUpdate(email=f"{name}-{i}-new@example.com"))
+        measure(results, "update_book", impl["update_book"], book_id,
+                schemas.BookUpdate(isbn=f"{name}-{i}-new", author_id=author_id))
+        measure(results, "delete_author (has books)", impl["delete_author"], author_id, expect=400)
+        measure(results, "delete_book", impl["delete_book"], book_id)
+        measure(results, "delete_author", impl["delete_author"], author_id)
+    return results
+
+
+if __name__ == "__main__":
+    print(f"{engine.dialect.name}, {ROUNDS} rounds, RETURNING: "
+          f"insert={engine.dialect.insert_returning} update={engine.dialect.update_returning}\n")
+    all_results = {name: run(name, impl) for name, impl in IMPLEMENTATIONS.items()}
+    print(f"{'operation':34}{'legacy stmts':>14}{'current stmts':>15}{'legacy ms':>12}{'current ms':>12}")
+    for op, (n, stmts, secs) in all_results["legacy"].items():
+        cn, cstmts, csecs = all_results["current"][op]
+        print(f"{op:34}{stmts / n:>14.1f}{cstmts / cn:>15.1f}{secs / n * 1000:>12.2f}{csecs / cn * 1000:>12.2f}")
@@ -0,0 +1,299 @@
+# bulk_router.py
+import os
+import io
+import csv
+import codecs
+import json
+from typing import Dict, List, Tuple
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from starlette.concurrency import run_in_threadpool
+
+from database import SessionLocal
+import models
+import schemas
+
+BULK_MAX_ROWS = int(os.getenv("BULK_MAX_ROWS", "100000"))
+BULK_CHUNK = 1000     # rows validated / inserted per executemany
+EXPORT_CHUNK = 1000   # rows fetched per keyset page while exporting
+
+NDJSON_TYPES = {"application/x-ndjson", "application/ndjson", "application/jsonl"}
+
+router = APIRouter(prefix="/bulk", tags=["bulk"])
+
+
+# -------------------- INPUT PARSING --------------------
+async def iter_lines(request: Request):
+    """Decoded lines of the body (newline kept) as it streams in."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()  # multi-byte chars may span pieces
+    buf = ""
+    async for piece in request.stream():
+        buf += decoder.decode(piece)
+        *lines, buf = buf.split("\n")
+        for line in lines:
+            yield line + "\n"
+    buf += decoder.decode(b"", final=True)
+    if buf:
+        yield buf
+
+
+async def iter_csv_rows(request: Request):
+    """
+    CSV rows (lists of values) parsed as the body streams in. Lines are fed
+    to csv.reader once a record is complete, i.e. outside a quoted field,
+    so quoted values may contain newlines.
+    """
+    record, quotes = "", 0
+    async for line in iter_lines(request):
+        record += line
+        quotes += line.count('"')
+        if quotes % 2 == 0:
+            for values in csv.reader([record]):
+                yield values
+            record, quotes = "", 0
+    if record:
+        for values in csv.reader([record]):
+            yield values
+
+
+def _parse_json_line(line: str):
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return ValueError(f"Invalid JSON: {e}")
+
+
+async def iter_chunks(request: Request):
+    """
+    Yield lists of (row_number, raw_dict) of up to BULK_CHUNK rows; a row that
+    cannot be parsed is an exception in place of raw_dict.
+    NDJSON and CSV (with a header row) are parsed as they stream in. A JSON
+    array is read whole before parsing, so large uploads should use NDJSON or CSV.
+    """
+    ctype = request.headers.get("content-type", "application/json").split(";")[0].strip().lower()
+    chunk, n = [], 0
+
+    if ctype in NDJSON_TYPES:
+        async for line in iter_lines(request):
+            if not line.strip():
+                continue
+            n += 1
+            chunk.append((n, _parse_json_line(line)))
+            if len(chunk) >= BULK_CHUNK:
+                yield chunk
+                chunk = []
+    elif ctype == "text/csv":
+        header = None
+        async for values in iter_csv_rows(request):
+            if not values:
+                continue
+            if header is None:
+                header = values
+                continue
+            n += 1
+            if len(values) != len(header):
+                chunk.append((n, ValueError(f"Expected {len(header)} fields, got {len(values)}")))
+            else:
+                chunk.append((n, dict(zip(header, values))))
+            if len(chunk) >= BULK_CHUNK:
+                yield chunk
+                chunk = []
+    else:
+        try:
+            rows = json.loads(await request.body())
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid JSON: {e}")
+        if not isinstance(rows, list):
+            raise HTTPException(status_code=400, detail="Expected a JSON array of objects")
+        for raw in rows:
+            n += 1
+            chunk.append((n, raw))
+            if len(chunk) >= BULK_CHUNK:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+def _error_text(e: Exception) -> str:
+    if isinstance(e, ValidationError):
+        return "; ".join(f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors())
+    return str(e)
+
+
+def _validate(chunk, schema, errors: List[Dict]) -> List[Tuple[int, dict]]:
+    valid = []
+    for row, raw in chunk:
+        if isinstance(raw, Exception):
+            errors.append({"row": row, "error": str(raw)})
+            continue
+        try:
+            valid.append((row, schema.model_validate(raw).model_dump()))
+        except (ValidationError, TypeError) as e:
+            errors.append({"row": row, "error": _error_text(e)})
+    return valid
+
+
+# -------------------- CHUNK IMPORTERS (run in threadpool) --------------------
+def import_authors_chunk(db, chunk, seen_emails: set, errors: List[Dict]) -> int:
+    valid = _validate(chunk, schemas.AuthorCreate, errors)
+
+    # duplicates inside the upload
+    fresh = []
+    for row, data in valid:
+        key = data["email"].lower()
+        if key in seen_emails:
+            errors.append({"row": row, "error": "Duplicate email in upload"})
+            continue
+        seen_emails.add(key)
+        fresh.append((row, data))
+
+    # duplicates already in the table: one IN (...) query per chunk
+    emails = [d["email"] for _, d in fresh]
+    existing = {e.lower() for e in db.scalars(select(models.Author.email).where(models.Author.email.in_(emails)))} if emails else set()
+    to_insert = []
+    for row, data in fresh:
+        if data["email"].lower() in existing:
+            errors.append({"row": row, "error": "Email already registered"})
+        else:
+            to_insert.append(data)
+
+    if to_insert:
+        db.execute(insert(models.Author), to_insert)  # executemany
+    return len(to_insert)
+
+
+def import_books_chunk(db, chunk, seen_isbns: set, errors: List[Dict]) -> int:
+    valid = _validate(chunk, schemas.BookCreate, errors)
+
+    fresh = []
+    for row, data in valid:
+        if data["isbn"] in seen_isbns:
+            errors.append({"row": row, "error": "Duplicate ISBN in upload"})
+            continue
+        seen_isbns.add(data["isbn"])
+        fresh.append((row, data))
+
+    isbns = [d["isbn"] for _, d in fresh]
+    author_ids = {d["author_id"] for _, d in fresh}
+    existing = set(db.scalars(select(models.Book.isbn).where(models.Book.isbn.in_(isbns)))) if isbns else set()
+    known_authors = set(db.scalars(select(models.Author.id).where(models.Author.id.in_(author_ids)))) if author_ids else set()
+
+    to_insert = []
+    for row, data in fresh:
+        if data["isbn"] in existing:
+            errors.append({"row": row, "error": "ISBN already exists"})
+        elif data["author_id"] not in known_authors:
+            errors.append({"row": row, "error": "Author does not exist"})
+        else:
+            to_insert.append(data)
+
+    if to_insert:
+        db.execute(insert(models.Book), to_insert)  # executemany
+    return len(to_insert)
+
+
+async def run_import(request: Request, import_chunk, all_or_nothing: bool):
+    """Validate + insert every chunk inside one transaction, then commit once."""
+    errors: List[Dict] = []
+    seen: set = set()
+    received = inserted = 0
+    db = SessionLocal()
+    try:
+        async for chunk in iter_chunks(request):
+            received += len(chunk)
+            if received > BULK_MAX_ROWS:
+                raise HTTPException(status_code=413, detail=f"At most {BULK_MAX_ROWS} rows per request")
+            inserted += await run_in_threadpool(import_chunk, db, chunk, seen, errors)
+
+        if errors and all_or_nothing:
+            await run_in_threadpool(db.rollback)
+            inserted = 0
+        else:
+            await run_in_threadpool(db.commit)
+    except IntegrityError as e:
+        # a concurrent writer inserted the same email/ISBN between our check and commit
+        await run_in_threadpool(db.rollback)
+        raise HTTPException(status_code=400, detail=f"Constraint violation, nothing imported: {e.orig}")
+    except BaseException:
+        await run_in_threadpool(db.rollback)
+        raise
+    finally:
+        await run_in_threadpool(db.close)
+
+    errors.sort(key=lambda e: e["row"])
+    return {"received": received, "inserted": inserted, "failed": len(errors), "errors": errors}
+
+
+@router.post("/authors")
+async def bulk_create_authors(
+    request: Request,
+    all_or_nothing: bool = Query(False, description="insert nothing if any row fails"),
+):
+    """Import authors from a JSON array, NDJSON or CSV (first_name,last_name,email)."""
+    return await run_import(request, import_authors_chunk, all_or_nothing)
+
+
+@router.post("/books")
+async def bulk_create_books(
+    request: Request,
+    all_or_nothing: bool = Query(False, description="insert nothing if any row fails"),
+):
+    """Import books from a JSON array, NDJSON or CSV (title,isbn,publication_year,available_copies,author_id)."""
+    return await run_import(request, import_books_chunk, all_or_nothing)
+
+
+# -------------------- EXPORT --------------------
+def export_rows(model, fmt: str):
+    """Stream the whole table in id order, one keyset page at a time, with its own session."""
+    columns = list(model.__table__.columns)
+    names = [c.name for c in columns]
+    with SessionLocal() as db:
+        if fmt == "csv":
+            out = io.StringIO()
+            writer = csv.writer(out)
+            writer.writerow(names)
+            yield out.getvalue()
+            out.seek(0)
+            out.truncate(0)
+        last_id = 0
+        while True:
+            rows = db.execute(
+                select(*columns).where(model.id > last_id).order_by(model.id).limit(EXPORT_CHUNK)
+            ).all()
+            if not rows:
+                break
+            if fmt == "csv":
+                writer.writerows(rows)
+                yield out.getvalue()
+                out.seek(0)
+                out.truncate(0)
+            else:
+                yield "".join(
+                    json.dumps(dict(zip(names, r)), default=str) + "\n" for r in rows
+                )
+            last_id = rows[-1].id
+
+
+def export_response(model, fmt: str, name: str):
+    media = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    ext = "csv" if fmt == "csv" else "ndjson"
+    return StreamingResponse(
+        export_rows(model, fmt),
+        media_type=media,
+        headers={"Content-Disposition": f'attachment; filename="{name}.{ext}"'},
+    )
+
+
+@router.get("/authors/export")
+def export_authors(format: str = Query("ndjson", pattern="^(ndjson|csv)$")):
+    return export_response(models.Author, format, "authors")
+
+
+@router.get("/books/export")
+def export_books(format: str = Query("ndjson", pattern="^(ndjson|csv)$")):
+    return export_response(models.Book, format, "books")
@@ -0,0 +1,283 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+
+from fastapi import Response, status
+
+CACHE_TTL = float(os.getenv("CACHE_TTL", "300"))            # seconds
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+CACHE_URL = os.getenv("CACHE_URL")                          # e.g. redis://localhost:6379/0 to share across workers
+CACHE_REDIS_TIMEOUT = float(os.getenv("CACHE_REDIS_TIMEOUT", "1"))  # seconds per Redis connect / command
+
+
+class LocalBackend:
+    """In-process TTL + LRU store. Thread-safe because sync routes run in FastAPI's threadpool."""
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: float):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    # no I/O: the async routes use the same methods
+    async def aget(self, key: str) -> Optional[Any]:
+        return self.get(key)
+
+    async def aset(self, key: str, value: Any, ttl: float):
+        self.set(key, value, ttl)
+
+    async def adelete(self, key: str):
+        self.delete(key)
+
+    def size(self) -> int:
+        return len(self._data)
+
+
+class RedisBackend:
+    """
+    Shared store with the same interface as LocalBackend (needs the optional `redis` package).
+    The a* methods use redis.asyncio so the async routes never block the event loop.
+
+    When Redis stops answering, calls fall back to an in-process LocalBackend
+    (cached routes degrade to a per-worker cache instead of failing) and Redis
+    is tried again on the next call. Deletes that could not reach Redis are
+    replayed once it answers again, so it does not serve invalidated entries.
+    """
+
+    def __init__(self, url: str):
+        import redis
+        import redis.asyncio
+        opts = {"socket_connect_timeout": CACHE_REDIS_TIMEOUT, "socket_timeout": CACHE_REDIS_TIMEOUT}
+        self._r = redis.Redis.from_url(url, **opts)
+        self._ar = redis.asyncio.Redis.from_url(url, **opts)
+        self._r.ping()  # from_url does not connect: fail here so _make_backend picks LocalBackend
+        self._errors = (redis.ConnectionError, redis.TimeoutError)
+        self.fallback = LocalBackend()
+        self.degraded = False
+        self._missed_deletes: set = set()
+        self._lock = threading.Lock()
+
+    def _down(self, e: Exception):
+        if not self.degraded:
+            print(f"Cache backend unreachable ({e}), using in-process cache until it answers")
+        self.degraded = True
+
+    def _missed(self, key: str):
+        with self._lock:
+            self._missed_deletes.add(key)
+
+    def _to_replay(self) -> list:
+        with self._lock:
+            return list(self._missed_deletes)
+
+    def _recovered(self, replayed: list):
+        with self._lock:
+            self._missed_deletes.difference_update(replayed)
+            self.degraded = False
+
+    def get(self, key: str) -> Optional[Any]:
+        replay = self._to_replay()
+        try:
+            if replay:
+                self._r.delete(*replay)
+            raw = self._r.get(key)
+        except self._errors as e:
+            self._down(e)
+            return self.fallback.get(key)
+        self._recovered(replay)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key: str, value: Any, ttl: float):
+        try:
+            self._r.set(key, json.dumps(value), ex=max(1, int(ttl)))
+        except self._errors as e:
+            self._down(e)
+            self.fallback.set(key, value, ttl)
+
+    def delete(self, key: str):
+        self.fallback.delete(key)
+        try:
+            self._r.delete(key)
+        except self._errors as e:
+            self._down(e)
+            self._missed(key)
+
+    async def aget(self, key: str) -> Optional[Any]:
+        replay = self._to_replay()
+        try:
+            if replay:
+                await self._ar.delete(*replay)
+            raw = await self._ar.get(key)
+        except self._errors as e:
+            self._down(e)
+            return self.fallback.get(key)
+        self._recovered(replay)
+        return json.loads(raw) if raw is not None else None
+
+    async def aset(self, key: str, value: Any, ttl: float):
+        try:
+            await self._ar.set(key, json.dumps(value), ex=max(1, int(ttl)))
+        except self._errors as e:
+            self._down(e)
+            self.fallback.set(key, value, ttl)
+
+    async def adelete(self, key: str):
+        self.fallback.delete(key)
+        try:
+            await self._ar.delete(key)
+        except self._errors as e:
+            self._down(e)
+            self._missed(key)
+
+    def size(self) -> int:
+        try:
+            return self._r.dbsize()
+        except self._errors:
+            return self.fallback.size()
+
+
+def _make_backend():
+    if CACHE_URL:
+        try:
+            return RedisBackend(CACHE_URL)
+        except Exception as e:
+            print(f"Cache backend {CACHE_URL} unavailable ({e}), using in-process cache")
+    return LocalBackend()
+
+
+backend = _make_backend()
+stats = {"hits": 0, "misses": 0, "invalidations": 0}
+_stats_lock = threading.Lock()  # sync routes update the counters from several threadpool workers
+
+
+def _count(name: str):
+    with _stats_lock:
+        stats[name] += 1
+
+
+def _key(kind: str, entity_id: int) -> str:
+    return f"{kind}:{entity_id}"
+
+
+def make_etag(data: dict) -> str:
+    body = json.dumps(data, sort_keys=True, default=str).encode()
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+def _lookup(key: str) -> Optional[dict]:
+    entry = backend.get(key)
+    _count("hits" if entry is not None else "misses")
+    return entry
+
+
+async def _lookup_async(key: str) -> Optional[dict]:
+    entry = await backend.aget(key)
+    _count("hits" if entry is not None else "misses")
+    return entry
+
+
+def _entry(schema, obj) -> dict:
+    data = schema.model_validate(obj).model_dump(mode="json")
+    return {"data": data, "etag": make_etag(data)}
+
+
+def _store(key: str, schema, obj) -> Optional[dict]:
+    if obj is None:
+        return None
+    entry = _entry(schema, obj)
+    backend.set(key, entry, CACHE_TTL)
+    return entry
+
+
+async def _store_async(key: str, schema, obj) -> Optional[dict]:
+    if obj is None:
+        return None
+    entry = _entry(schema, obj)
+    await backend.aset(key, entry, CACHE_TTL)
+    return entry
+
+
+def get_entity(db, kind: str, model, schema, entity_id: int) -> Optional[dict]:
+    """
+    Read-through lookup: returns {"data": <schema dict>, "etag": ...} from the
+    cache, or loads the row, caches it and returns it. None if the row doesn't exist.
+    """
+    key = _key(kind, entity_id)
+    entry = _lookup(key)
+    if entry is not None:
+        return entry
+    return _store(key, schema, db.get(model, entity_id))
+
+
+async def get_entity_async(db, kind: str, model, schema, entity_id: int) -> Optional[dict]:
+    """get_entity() for an AsyncSession (same cache, same entries)."""
+    key = _key(kind, entity_id)
+    entry = await _lookup_async(key)
+    if entry is not None:
+        return entry
+    return await _store_async(key, schema, await db.get(model, entity_id))
+
+
+def invalidate(kind: str, entity_id: int):
+    _count("invalidations")
+    backend.delete(_key(kind, entity_id))
+
+
+async def invalidate_async(kind: str, entity_id: int):
+    _count("invalidations")
+    await backend.adelete(_key(kind, entity_id))
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+def cached_response(entry: dict, response: Response, if_none_match: Optional[str]):
+    """Return the cached payload with its ETag, or an empty 304 if the client already has it."""
+    if etag_matches(if_none_match, entry["etag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": entry["etag"]})
+    response.headers["ETag"] = entry["etag"]
+    return entry["data"]
+
+
+def cache_stats() -> dict:
+    with _stats_lock:
+        counters = dict(stats)
+    lookups = counters["hits"] + counters["misses"]
+    return {
+        **counters,
+        "hit_ratio": round(counters["hits"] / lookups, 3) if lookups else 0.0,
+        "entries": backend.size(),
+        "backend": type(backend).__name__,
+        "degraded": getattr(backend, "degraded", False),
+        "ttl": CACHE_TTL,
+    }
@@ -1,12 +1,12 @@
 import React, { useEffect } from "react";
 import { useDispatch, useSelector } from "react-redux";
-import { fetchBooks, deleteBook } from "../../redux/booksSlice";
+import { fetchBooks, fetchMoreBooks, deleteBook } from "../../redux/booksSlice";
 import { useNavigate } from "react-router-dom";
 
 export default function HomeBooks(){
   const dispatch = useDispatch();
   const navigate = useNavigate();
-  const { items, loading, error } = useSelector(s=>s.books);
+  const { items, nextCursor, loading, error } = useSelector(s=>s.books);
 
   useEffect(()=>{ dispatch(fetchBooks()); },[dispatch]);
 
@@ -32,6 +32,9 @@ export default function HomeBooks(){
           </div>
         ))}
       </div>
+      {nextCursor !== null && (
+        <button className="btn btn-secondary mb-4" disabled={loading} onClick={()=>dispatch(fetchMoreBooks())}>Load more</button>
+      )}
     </div>
   );
 }
@@ -1,10 +1,10 @@
 import React, { useEffect } from "react";
 import { useDispatch, useSelector } from "react-redux";
-import { fetchConversations, fetchMessages, setActiveConversation } from "../../redux/chatSlice";
+import { fetchConversations, fetchMoreConversations, fetchMessages, setActiveConversation } from "../../redux/chatSlice";
 
 export default function ChatSidebar(){
   const dispatch = useDispatch();
-  const { conversations, activeConversationId } = useSelector(s=>s.chat);
+  const { conversations, conversationsCursor, activeConversationId } = useSelector(s=>s.chat);
 
   useEffect(()=>{ dispatch(fetchConversations()); },[dispatch]);
 
@@ -25,6 +25,10 @@ export default function ChatSidebar(){
           </li>
         ))}
       </ul>
+      {conversationsCursor && (
+        <button className="btn btn-sm btn-outline-secondary mt-2 w-100"
+          onClick={()=>dispatch(fetchMoreConversations())}>Load more</button>
+      )}
     </div>
   );
 }
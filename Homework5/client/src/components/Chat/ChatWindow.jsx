@@ -1,12 +1,19 @@
 import React from "react";
-import { useSelector } from "react-redux";
+import { useDispatch, useSelector } from "react-redux";
+import { fetchOlderMessages } from "../../redux/chatSlice";
 
 export default function ChatWindow(){
-  const { activeConversationId, messagesByConv } = useSelector(s=>s.chat);
-  const msgs = activeConversationId ? (messagesByConv[activeConversationId] || []) : [];
+  const dispatch = useDispatch();
+  const { activeConversationId, messagesByConversation, olderCursorByConversation } = useSelector(s=>s.chat);
+  const msgs = activeConversationId ? (messagesByConversation[activeConversationId] || []) : [];
+  const hasOlder = activeConversationId && olderCursorByConversation[activeConversationId];
   return (
     <div className="p-3" style={{flex:1, overflowY:"auto", height:"70vh"}}>
       {activeConversationId === null && <p>Start a new conversation…</p>}
+      {hasOlder && (
+        <button className="btn btn-sm btn-outline-secondary mb-3"
+          onClick={()=>dispatch(fetchOlderMessages(activeConversationId))}>Load earlier messages</button>
+      )}
       {msgs.map(m=>(
         <div key={m.id} className="mb-3">
           <div><strong>{m.role}</strong></div>
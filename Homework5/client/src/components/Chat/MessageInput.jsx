@@ -1,6 +1,6 @@
 import React, { useState } from "react";
 import { useDispatch, useSelector } from "react-redux";
-import { sendMessage, fetchMessages, setActiveConversation } from "../../redux/chatSlice";
+import { sendMessage, fetchNewMessages, fetchConversations, setActiveConversation } from "../../redux/chatSlice";
 
 export default function MessageInput(){
   const [text, setText] = useState(""); 
@@ -12,9 +12,10 @@ export default function MessageInput(){
     if(!text.trim()) return;
     // Send to backend; if conversationId is null, backend will create one.
     const res = await dispatch(sendMessage({ conversationId: activeConversationId, message: text })).unwrap();
-    // Optionally refresh the thread after sending
+    // Load only the new user/assistant messages; a new conversation also needs the sidebar refreshed
     dispatch(setActiveConversation(res.conversation_id));
-    dispatch(fetchMessages(res.conversation_id));
+    dispatch(fetchNewMessages(res.conversation_id));
+    if (activeConversationId === null) dispatch(fetchConversations());
     setText("");
   };
 
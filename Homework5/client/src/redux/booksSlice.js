@@ -6,9 +6,18 @@ const api = axios.create({
   baseURL: process.env.REACT_APP_API_BASE || "http://127.0.0.1:8000",
 });
 
+const PAGE_SIZE = 50;
+
 // THUNKS
+// /books is keyset-paginated: { items, next_cursor }; pass next_cursor back as after_id
 export const fetchBooks = createAsyncThunk("books/fetchAll", async (_, thunkAPI) => {
-  try { const { data } = await api.get("/books"); return data; }
+  try { const { data } = await api.get("/books", { params: { limit: PAGE_SIZE } }); return data; }
+  catch (e) { return thunkAPI.rejectWithValue(e.response?.data?.detail || e.message); }
+});
+
+export const fetchMoreBooks = createAsyncThunk("books/fetchMore", async (_, thunkAPI) => {
+  const { nextCursor } = thunkAPI.getState().books;
+  try { const { data } = await api.get("/books", { params: { limit: PAGE_SIZE, after_id: nextCursor } }); return data; }
   catch (e) { return thunkAPI.rejectWithValue(e.response?.data?.detail || e.message); }
 });
 
@@ -29,13 +38,17 @@ export const deleteBook = createAsyncThunk("books/delete", async (id, thunkAPI)
 
 const slice = createSlice({
   name: "books",
-  initialState: { items: [], loading: false, error: null },
+  initialState: { items: [], nextCursor: null, loading: false, error: null },
   reducers: {},
   extraReducers: (b) => {
     // fetch
     b.addCase(fetchBooks.pending,  (s)=>{s.loading=true; s.error=null;});
-    b.addCase(fetchBooks.fulfilled,(s,a)=>{s.loading=false; s.items=a.payload;});
+    b.addCase(fetchBooks.fulfilled,(s,a)=>{s.loading=false; s.items=a.payload.items; s.nextCursor=a.payload.next_cursor ?? null;});
     b.addCase(fetchBooks.rejected, (s,a)=>{s.loading=false; s.error=a.payload;});
+    // next page
+    b.addCase(fetchMoreBooks.pending,  (s)=>{s.loading=true; s.error=null;});
+    b.addCase(fetchMoreBooks.fulfilled,(s,a)=>{s.loading=false; s.items.push(...a.payload.items); s.nextCursor=a.payload.next_cursor ?? null;});
+    b.addCase(fetchMoreBooks.rejected, (s,a)=>{s.loading=false; s.error=a.payload;});
     // create
     b.addCase(createBook.fulfilled,(s,a)=>{s.items.push(a.payload);});
     // update
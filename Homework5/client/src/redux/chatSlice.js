@@ -8,12 +8,30 @@ const api = axios.create({
 
 // ------------------ ASYNC THUNKS ------------------
 
-// Fetch all conversations
+const PAGE_SIZE = 30;
+
+// Fetch the first page of conversations (most recently active first)
 export const fetchConversations = createAsyncThunk(
   "chat/fetchConversations",
   async (_, thunkAPI) => {
     try {
-      const { data } = await api.get("/ai/conversations");
+      const { data } = await api.get("/ai/conversations", { params: { limit: PAGE_SIZE } });
+      return data; // { items, limit, next_cursor }
+    } catch (err) {
+      return thunkAPI.rejectWithValue(err.response?.data?.detail || err.message);
+    }
+  }
+);
+
+// Append the next page of conversations to the sidebar
+export const fetchMoreConversations = createAsyncThunk(
+  "chat/fetchMoreConversations",
+  async (_, thunkAPI) => {
+    const { conversationsCursor } = thunkAPI.getState().chat;
+    try {
+      const { data } = await api.get("/ai/conversations", {
+        params: { limit: PAGE_SIZE, before: conversationsCursor },
+      });
       return data;
     } catch (err) {
       return thunkAPI.rejectWithValue(err.response?.data?.detail || err.message);
@@ -21,13 +39,46 @@ export const fetchConversations = createAsyncThunk(
   }
 );
 
-// Fetch all messages for a specific conversation
+// Fetch the latest messages of a conversation
 export const fetchMessages = createAsyncThunk(
   "chat/fetchMessages",
   async (conversationId, thunkAPI) => {
     try {
-      const { data } = await api.get(`/ai/messages/${conversationId}`);
-      return { conversationId, messages: data };
+      const { data } = await api.get(`/ai/messages/${conversationId}`, { params: { limit: PAGE_SIZE } });
+      return { conversationId, page: data }; // page = { items, limit, prev_cursor? }
+    } catch (err) {
+      return thunkAPI.rejectWithValue(err.response?.data?.detail || err.message);
+    }
+  }
+);
+
+// Prepend the page of messages before the oldest one loaded
+export const fetchOlderMessages = createAsyncThunk(
+  "chat/fetchOlderMessages",
+  async (conversationId, thunkAPI) => {
+    const beforeId = thunkAPI.getState().chat.olderCursorByConversation[conversationId];
+    try {
+      const { data } = await api.get(`/ai/messages/${conversationId}`, {
+        params: { limit: PAGE_SIZE, before_id: beforeId },
+      });
+      return { conversationId, page: data };
+    } catch (err) {
+      return thunkAPI.rejectWithValue(err.response?.data?.detail || err.message);
+    }
+  }
+);
+
+// Append only the messages newer than the last one loaded
+export const fetchNewMessages = createAsyncThunk(
+  "chat/fetchNewMessages",
+  async (conversationId, thunkAPI) => {
+    const loaded = thunkAPI.getState().chat.messagesByConversation[conversationId] || [];
+    if (!loaded.length) return thunkAPI.dispatch(fetchMessages(conversationId)).unwrap();
+    try {
+      const { data } = await api.get(`/ai/messages/${conversationId}`, {
+        params: { limit: 500, after_id: loaded[loaded.length - 1].id },
+      });
+      return { conversationId, page: data, incremental: true };
     } catch (err) {
       return thunkAPI.rejectWithValue(err.response?.data?.detail || err.message);
     }
@@ -56,7 +107,9 @@ const chatSlice = createSlice({
   name: "chat",
   initialState: {
     conversations: [],
+    conversationsCursor: null, // next_cursor for the next (older) page of conversations
     messagesByConversation: {}, // key = conversationId
+    olderCursorByConversation: {}, // key = conversationId, before_id for older messages
     loading: false,
     error: null,
     activeConversationId: null,
@@ -78,17 +131,42 @@ const chatSlice = createSlice({
       })
       .addCase(fetchConversations.fulfilled, (state, action) => {
         state.loading = false;
-        state.conversations = action.payload;
+        state.conversations = action.payload.items;
+        state.conversationsCursor = action.payload.next_cursor ?? null;
       })
       .addCase(fetchConversations.rejected, (state, action) => {
         state.loading = false;
         state.error = action.payload;
       })
+      .addCase(fetchMoreConversations.fulfilled, (state, action) => {
+        const known = new Set(state.conversations.map((c) => c.id));
+        state.conversations.push(...action.payload.items.filter((c) => !known.has(c.id)));
+        state.conversationsCursor = action.payload.next_cursor ?? null;
+      })
 
-      // fetchMessages
+      // fetchMessages / fetchOlderMessages / fetchNewMessages
       .addCase(fetchMessages.fulfilled, (state, action) => {
-        const { conversationId, messages } = action.payload;
-        state.messagesByConversation[conversationId] = messages;
+        const { conversationId, page } = action.payload;
+        state.messagesByConversation[conversationId] = page.items;
+        state.olderCursorByConversation[conversationId] = page.prev_cursor ?? null;
+      })
+      .addCase(fetchOlderMessages.fulfilled, (state, action) => {
+        const { conversationId, page } = action.payload;
+        const loaded = state.messagesByConversation[conversationId] || [];
+        state.messagesByConversation[conversationId] = [...page.items, ...loaded];
+        state.olderCursorByConversation[conversationId] = page.prev_cursor ?? null;
+      })
+      .addCase(fetchNewMessages.fulfilled, (state, action) => {
+        const { conversationId, page, incremental } = action.payload;
+        if (!incremental) {
+          state.messagesByConversation[conversationId] = page.items;
+          state.olderCursorByConversation[conversationId] = page.prev_cursor ?? null;
+          return;
+        }
+        const loaded = state.messagesByConversation[conversationId] || [];
+        const known = new Set(loaded.map((m) => m.id));
+        loaded.push(...page.items.filter((m) => !known.has(m.id)));
+        state.messagesByConversation[conversationId] = loaded;
       })
 
       // sendMessage
@@ -96,11 +174,17 @@ const chatSlice = createSlice({
         state.loading = true;
       })
       .addCase(sendMessage.fulfilled, (state, action) => {
+        // the user + assistant messages are picked up by fetchNewMessages (after_id)
         const { conversation_id, assistant_message } = action.payload;
-        if (!state.messagesByConversation[conversation_id])
-          state.messagesByConversation[conversation_id] = [];
-        state.messagesByConversation[conversation_id].push(assistant_message);
         state.activeConversationId = conversation_id;
+        // move the conversation to the top of the sidebar without refetching the list
+        const i = state.conversations.findIndex((c) => c.id === conversation_id);
+        if (i > -1) {
+          const [conv] = state.conversations.splice(i, 1);
+          conv.message_count += 2;
+          conv.last_message_at = assistant_message.created_at;
+          state.conversations.unshift(conv);
+        }
         state.loading = false;
       })
       .addCase(sendMessage.rejected, (state, action) => {
@@ -1,9 +1,13 @@
-from fastapi import FastAPI, Depends, HTTPException, Response, status, Query
+from fastapi import FastAPI, Depends, HTTPException, Response, status, Query, Header
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
-from typing import List
+from typing import Optional
 
-from database import Base, engine, get_db
+from database import Base, engine, get_db, DB_ASYNC
+from pagination import parse_fields, keyset_page, cached_count
+import cache
+import sql_metrics
+from writes import constraint_errors, insert_row, update_row, delete_row
 import models
 import schemas
 
@@ -22,6 +26,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# SQL statement count / DB time per request (Server-Timing header, GET /metrics)
+sql_metrics.instrument(engine)
+app.middleware("http")(sql_metrics.sql_metrics_middleware)
+app.include_router(sql_metrics.router)
+
 
 # -------------------- HEALTH CHECK --------------------
 @app.get("/", tags=["health"])
@@ -29,141 +38,158 @@ def root():
     return {"status": "ok", "service": "library-api"}
 
 
+@app.get("/cache/stats", tags=["health"])
+def get_cache_stats():
+    return cache.cache_stats()
+
+
 # -------------------- AUTHORS CRUD --------------------
 @app.post("/authors", response_model=schemas.AuthorOut, status_code=status.HTTP_201_CREATED)
 def create_author(payload: schemas.AuthorCreate, db: Session = Depends(get_db)):
-    exists = db.query(models.Author).filter(models.Author.email == payload.email).first()
-    if exists:
-        raise HTTPException(status_code=400, detail="Email already registered")
-    author = models.Author(**payload.model_dump())
-    db.add(author)
-    db.commit()
-    db.refresh(author)
+    with constraint_errors(db):
+        author = insert_row(db, models.Author, payload.model_dump())
+        db.commit()
     return author
 
-
-@app.get("/authors", response_model=schemas.PaginatedAuthors)
+@app.get("/authors", response_model=schemas.PaginatedAuthors, response_model_exclude_unset=True)
 def list_authors(
-    page: int = Query(1, ge=1),
-    size: int = Query(10, ge=1, le=100),
+    limit: int = Query(10, ge=1, le=100),
+    after_id: Optional[int] = Query(None, description="next_cursor from the previous page"),
+    fields: Optional[str] = Query(None, description="comma-separated columns, e.g. first_name,email"),
+    include_total: bool = False,
     db: Session = Depends(get_db),
 ):
-    q = db.query(models.Author)
-    total = q.count()
-    items = q.order_by(models.Author.id).offset((page - 1) * size).limit(size).all()
-    return {"items": items, "page": page, "size": size, "total": total}
+    cols = parse_fields(models.Author, fields)
+    items, next_cursor = keyset_page(db, models.Author, limit, after_id, cols)
+    page = {"items": items, "limit": limit, "next_cursor": next_cursor}
+    if include_total:
+        page["total"] = cached_count(db, models.Author)
+    return page
 
 
 @app.get("/authors/{author_id}", response_model=schemas.AuthorOut)
-def get_author(author_id: int, db: Session = Depends(get_db)):
-    author = db.get(models.Author, author_id)
-    if not author:
+def get_author(
+    author_id: int,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+):
+    entry = cache.get_entity(db, "author", models.Author, schemas.AuthorOut, author_id)
+    if not entry:
         raise HTTPException(status_code=404, detail="Author not found")
-    return author
+    return cache.cached_response(entry, response, if_none_match)
 
 
 @app.put("/authors/{author_id}", response_model=schemas.AuthorOut)
 def update_author(author_id: int, payload: schemas.AuthorUpdate, db: Session = Depends(get_db)):
-    author = db.get(models.Author, author_id)
+    with constraint_errors(db):
+        author = update_row(db, models.Author, author_id, payload.model_dump(exclude_unset=True))
+        db.commit()
     if not author:
         raise HTTPException(status_code=404, detail="Author not found")
-
-    if payload.email and payload.email != author.email:
-        exists = db.query(models.Author).filter(models.Author.email == payload.email).first()
-        if exists:
-            raise HTTPException(status_code=400, detail="Email already registered")
-
-    for k, v in payload.model_dump(exclude_unset=True).items():
-        setattr(author, k, v)
-    db.commit()
-    db.refresh(author)
+    cache.invalidate("author", author_id)
     return author
 
 
 @app.delete("/authors/{author_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_author(author_id: int, db: Session = Depends(get_db)):
-    author = db.get(models.Author, author_id)
-    if not author:
+    # books.author_id is ON DELETE RESTRICT, so the DELETE itself refuses authors with books
+    with constraint_errors(db, fk_detail="Cannot delete author with associated books"):
+        deleted = delete_row(db, models.Author, author_id)
+        db.commit()
+    if not deleted:
         raise HTTPException(status_code=404, detail="Author not found")
-
-    has_books = db.query(models.Book).filter(models.Book.author_id == author_id).first()
-    if has_books:
-        raise HTTPException(status_code=400, detail="Cannot delete author with associated books")
-
-    db.delete(author)
-    db.commit()
+    cache.invalidate("author", author_id)
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
-
-@app.get("/authors/{author_id}/books", response_model=List[schemas.BookOut])
-def books_by_author(author_id: int, db: Session = Depends(get_db)):
-    author = db.get(models.Author, author_id)
-    if not author:
+@app.get("/authors/{author_id}/books", response_model=schemas.PaginatedBooks, response_model_exclude_unset=True)
+def books_by_author(
+    author_id: int,
+    limit: int = Query(50, ge=1, le=500),
+    after_id: Optional[int] = Query(None, description="next_cursor from the previous page"),
+    fields: Optional[str] = Query(None, description="comma-separated columns, e.g. title,isbn"),
+    include_total: bool = False,
+    db: Session = Depends(get_db),
+):
+    if not cache.get_entity(db, "author", models.Author, schemas.AuthorOut, author_id):
         raise HTTPException(status_code=404, detail="Author not found")
-    return db.query(models.Book).filter(models.Book.author_id == author_id).order_by(models.Book.id).all()
+    cols = parse_fields(models.Book, fields)
+    filters = (models.Book.author_id == author_id,)
+    items, next_cursor = keyset_page(db, models.Book, limit, after_id, cols, filters)
+    page = {"items": items, "limit": limit, "next_cursor": next_cursor}
+    if include_total:
+        page["total"] = cached_count(db, models.Book, filters, key=("author", author_id))
+    return page
 
 
 # -------------------- BOOKS CRUD --------------------
 @app.post("/books", response_model=schemas.BookOut, status_code=status.HTTP_201_CREATED)
 def create_book(payload: schemas.BookCreate, db: Session = Depends(get_db)):
-    if not db.get(models.Author, payload.author_id):
-        raise HTTPException(status_code=400, detail="Author does not exist")
-
-    exists = db.query(models.Book).filter(models.Book.isbn == payload.isbn).first()
-    if exists:
-        raise HTTPException(status_code=400, detail="ISBN already exists")
-
-    book = models.Book(**payload.model_dump())
-    db.add(book)
-    db.commit()
-    db.refresh(book)
+    with constraint_errors(db):
+        book = insert_row(db, models.Book, payload.model_dump())
+        db.commit()
     return book
 
-
-@app.get("/books", response_model=List[schemas.BookOut])
-def list_books(db: Session = Depends(get_db)):
-    return db.query(models.Book).order_by(models.Book.id).all()
+@app.get("/books", response_model=schemas.PaginatedBooks, response_model_exclude_unset=True)
+def list_books(
+    limit: int = Query(50, ge=1, le=500),
+    after_id: Optional[int] = Query(None, description="next_cursor from the previous page"),
+    fields: Optional[str] = Query(None, description="comma-separated columns, e.g. title,isbn"),
+    include_total: bool = False,
+    db: Session = Depends(get_db),
+):
+    cols = parse_fields(models.Book, fields)
+    items, next_cursor = keyset_page(db, models.Book, limit, after_id, cols)
+    page = {"items": items, "limit": limit, "next_cursor": next_cursor}
+    if include_total:
+        page["total"] = cached_count(db, models.Book)
+    return page
 
 
 @app.get("/books/{book_id}", response_model=schemas.BookOut)
-def get_book(book_id: int, db: Session = Depends(get_db)):
-    book = db.get(models.Book, book_id)
-    if not book:
+def get_book(
+    book_id: int,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+):
+    entry = cache.get_entity(db, "book", models.Book, schemas.BookOut, book_id)
+    if not entry:
         raise HTTPException(status_code=404, detail="Book not found")
-    return book
+    return cache.cached_response(entry, response, if_none_match)
 
 
 @app.put("/books/{book_id}", response_model=schemas.BookOut)
 def update_book(book_id: int, payload: schemas.BookUpdate, db: Session = Depends(get_db)):
-    book = db.get(models.Book, book_id)
+    with constraint_errors(db):
+        book = update_row(db, models.Book, book_id, payload.model_dump(exclude_unset=True))
+        db.commit()
     if not book:
         raise HTTPException(status_code=404, detail="Book not found")
-
-    if payload.isbn and payload.isbn != book.isbn:
-        exists = db.query(models.Book).filter(models.Book.isbn == payload.isbn).first()
-        if exists:
-            raise HTTPException(status_code=400, detail="ISBN already exists")
-
-    if payload.author_id and not db.get(models.Author, payload.author_id):
-        raise HTTPException(status_code=400, detail="Author does not exist")
-
-    for k, v in payload.model_dump(exclude_unset=True).items():
-        setattr(book, k, v)
-    db.commit()
-    db.refresh(book)
+    cache.invalidate("book", book_id)
     return book
 
 
 @app.delete("/books/{book_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_book(book_id: int, db: Session = Depends(get_db)):
-    book = db.get(models.Book, book_id)
-    if not book:
-        raise HTTPException(status_code=404, detail="Book not found")
-    db.delete(book)
+    deleted = delete_row(db, models.Book, book_id)
     db.commit()
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Book not found")
+    cache.invalidate("book", book_id)
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
-
 # -------------------- AI CHAT ROUTER --------------------
 from ai_router import router as ai_router
 app.include_router(ai_router)
+
+# -------------------- BULK IMPORT / EXPORT --------------------
+from bulk_router import router as bulk_router
+app.include_router(bulk_router)
+
+# -------------------- ASYNC ENGINE (DB_ASYNC=true) --------------------
+if DB_ASYNC:
+    from database import async_engine
+    from async_router import router as async_router
+    sql_metrics.instrument(async_engine.sync_engine)
+    app.include_router(async_router)
@@ -1,9 +1,14 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey
+from datetime import datetime, timezone
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from database import Base
 
 
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
 class Author(Base):
     __tablename__ = "authors"
     id = Column(Integer, primary_key=True, index=True)
@@ -34,15 +39,24 @@ class Conversation(Base):
     title = Column(String(200), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # denormalized so the sidebar can list by activity without touching messages;
+    # written from Python (not func.now()) so it compares exactly with the cursor value
+    last_message_at = Column(DateTime(timezone=True), default=utcnow, server_default=func.now(), nullable=False)
+    message_count = Column(Integer, nullable=False, default=0, server_default="0")
 
     messages = relationship("Message", back_populates="conversation", cascade="all, delete-orphan")
 
+    __table_args__ = (Index("ix_conversations_last_message_at_id", "last_message_at", "id"),)
+
 class Message(Base):
     __tablename__ = "messages"
     id = Column(Integer, primary_key=True, index=True)
-    conversation_id = Column(Integer, ForeignKey("conversations.id", ondelete="CASCADE"), nullable=False, index=True)
+    conversation_id = Column(Integer, ForeignKey("conversations.id", ondelete="CASCADE"), nullable=False)
     role = Column(String(16), nullable=False)  # "user" | "assistant" | "system"
     content = Column(Text, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
-    conversation = relationship("Conversation", back_populates="messages")
\ No newline at end of file
+    conversation = relationship("Conversation", back_populates="messages")
+
+    # "last N messages of a conversation" = one index range scan (also serves the FK)
+    __table_args__ = (Index("ix_messages_conversation_id_id", "conversation_id", "id"),)
\ No newline at end of file
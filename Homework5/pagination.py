@@ -0,0 +1,104 @@
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+COUNT_CACHE_TTL = float(os.getenv("COUNT_CACHE_TTL", "30"))  # seconds
+
+# cache key -> (total, expires_at)
+_count_cache: Dict[Tuple, Tuple[int, float]] = {}
+
+
+def parse_fields(model, fields: Optional[str]) -> Optional[List[str]]:
+    """Turn 'title,isbn' into a validated column list (id is always included)."""
+    if not fields:
+        return None
+    names = [f.strip() for f in fields.split(",") if f.strip()]
+    columns = set(model.__table__.columns.keys())
+    unknown = [n for n in names if n not in columns]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown field(s): {', '.join(unknown)}")
+    return ["id"] + [n for n in names if n != "id"]
+
+
+def keyset_stmt(model, limit: int, after_id: Optional[int] = None,
+                fields: Optional[List[str]] = None, filters=()):
+    """
+    One page ordered by primary key, starting strictly after `after_id`.
+    Uses WHERE id > :after_id ... LIMIT so every page costs the same no
+    matter how deep the client is. Fetches limit+1 rows to know if there is a next page.
+    """
+    cols = [getattr(model, f) for f in fields] if fields else [model]
+    stmt = select(*cols).where(*filters)
+    if after_id is not None:
+        stmt = stmt.where(model.id > after_id)
+    return stmt.order_by(model.id).limit(limit + 1)
+
+
+def _to_page(rows: list, limit: int, fields: Optional[List[str]]):
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    last = rows[-1] if rows else None
+    next_cursor = None
+    if has_more and last is not None:
+        next_cursor = last["id"] if fields else last.id
+    return rows, next_cursor
+
+
+def keyset_page(db: Session, model, limit: int, after_id: Optional[int] = None,
+                fields: Optional[List[str]] = None, filters=()):
+    """
+    Returns (items, next_cursor) for keyset_stmt(); with `fields`, items are
+    dicts of just those columns.
+    """
+    stmt = keyset_stmt(model, limit, after_id, fields, filters)
+    if fields:
+        rows = [dict(r._mapping) for r in db.execute(stmt)]
+    else:
+        rows = list(db.scalars(stmt))
+    return _to_page(rows, limit, fields)
+
+
+async def keyset_page_async(db, model, limit: int, after_id: Optional[int] = None,
+                            fields: Optional[List[str]] = None, filters=()):
+    """keyset_page() for an AsyncSession."""
+    stmt = keyset_stmt(model, limit, after_id, fields, filters)
+    if fields:
+        rows = [dict(r._mapping) for r in await db.execute(stmt)]
+    else:
+        rows = list(await db.scalars(stmt))
+    return _to_page(rows, limit, fields)
+
+
+def _count_key(model, key: Tuple) -> Tuple:
+    return (model.__tablename__,) + tuple(key)
+
+
+def _cached(cache_key: Tuple) -> Optional[int]:
+    hit = _count_cache.get(cache_key)
+    if hit and hit[1] > time.monotonic():
+        return hit[0]
+    return None
+
+
+def cached_count(db: Session, model, filters=(), key: Tuple = ()) -> int:
+    """COUNT(*) cached for COUNT_CACHE_TTL seconds (an approximate total, opt-in per request)."""
+    cache_key = _count_key(model, key)
+    total = _cached(cache_key)
+    if total is None:
+        total = db.scalar(select(func.count()).select_from(model).where(*filters))
+        _count_cache[cache_key] = (total, time.monotonic() + COUNT_CACHE_TTL)
+    return total
+
+
+async def cached_count_async(db, model, filters=(), key: Tuple = ()) -> int:
+    """cached_count() for an AsyncSession (shares the same cache)."""
+    cache_key = _count_key(model, key)
+    total = _cached(cache_key)
+    if total is None:
+        total = await db.scalar(select(func.count()).select_from(model).where(*filters))
+        _count_cache[cache_key] = (total, time.monotonic() + COUNT_CACHE_TTL)
+    return total
@@ -48,12 +48,41 @@ class BookOut(BookBase):
     class Config:
         from_attributes = True
 
-# Helper list responses
+# Partial rows for sparse field selection (?fields=...); unset fields are omitted
+class AuthorPartial(BaseModel):
+    id: int
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    email: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    class Config:
+        from_attributes = True
+
+class BookPartial(BaseModel):
+    id: int
+    title: Optional[str] = None
+    isbn: Optional[str] = None
+    publication_year: Optional[int] = None
+    available_copies: Optional[int] = None
+    author_id: Optional[int] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    class Config:
+        from_attributes = True
+
+# Helper list responses (keyset pagination: pass next_cursor back as after_id)
 class PaginatedAuthors(BaseModel):
-    items: List[AuthorOut]
-    page: int
-    size: int
-    total: int
+    items: List[AuthorPartial]
+    limit: int
+    next_cursor: Optional[int] = None
+    total: Optional[int] = None  # only with include_total=true (cached, may lag)
+
+class PaginatedBooks(BaseModel):
+    items: List[BookPartial]
+    limit: int
+    next_cursor: Optional[int] = None
+    total: Optional[int] = None  # only with include_total=true (cached, may lag)
 
 
 # ---- Conversations ----
@@ -65,9 +94,16 @@ class ConversationOut(BaseModel):
     title: str
     created_at: datetime
     updated_at: Optional[datetime] = None
+    last_message_at: Optional[datetime] = None
+    message_count: int = 0
     class Config:
         from_attributes = True
 
+class PaginatedConversations(BaseModel):
+    items: List[ConversationOut]
+    limit: int
+    next_cursor: Optional[str] = None  # pass back as ?before= for the next (older) page
+
 # ---- Messages ----
 class MessageCreate(BaseModel):
     conversation_id: int
@@ -83,6 +119,12 @@ class MessageOut(BaseModel):
     class Config:
         from_attributes = True
 
+class MessagePage(BaseModel):
+    items: List[MessageOut]  # oldest first
+    limit: int
+    prev_cursor: Optional[int] = None  # pass as ?before_id= to load older messages
+    next_cursor: Optional[int] = None  # pass as ?after_id= when more newer messages remain
+
 # ---- Chat I/O ----
 class ChatIn(BaseModel):
     conversation_id: Optional[int] = None
@@ -0,0 +1,155 @@
+# sql_metrics.py
+# Per-request SQL statement count and DB time, collected with SQLAlchemy
+# cursor events and reported as a Server-Timing header and on GET /metrics.
+import os
+import time
+import threading
+from collections import deque
+from contextvars import ContextVar
+from typing import Optional
+
+from fastapi import APIRouter, Request
+from sqlalchemy import event
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+SLOW_QUERY_KEEP = int(os.getenv("SLOW_QUERY_KEEP", "50"))   # most recent slow statements kept for /metrics
+
+# stats of the request being served (sync routes run in the threadpool with a copy of this context)
+_current: ContextVar[Optional[dict]] = ContextVar("sql_metrics", default=None)
+
+_lock = threading.Lock()
+routes: dict = {}                       # "GET /books/{book_id}" -> aggregate
+slow_queries: deque = deque(maxlen=SLOW_QUERY_KEEP)
+totals = {"statements": 0, "db_ms": 0.0, "slow": 0, "failed": 0}
+
+
+# -------------------- SQLALCHEMY HOOKS --------------------
+def _record_statement(statement: str, ms: float, failed: bool = False):
+    stats = _current.get()
+    slow = ms >= SLOW_QUERY_MS
+    with _lock:
+        totals["statements"] += 1
+        totals["db_ms"] += ms
+        totals["failed"] += failed
+        if slow:
+            totals["slow"] += 1
+            slow_queries.append({
+                "ms": round(ms, 2),
+                "statement": " ".join(statement.split())[:500],
+                "route": stats["route"] if stats else None,
+                "failed": failed,
+                "at": time.time(),
+            })
+    if stats is not None:
+        stats["statements"] += 1
+        stats["db_ms"] += ms
+        stats["slow"] += slow
+        stats["failed"] += failed
+    if slow:
+        print(f"Slow query ({ms:.1f} ms): {' '.join(statement.split())[:200]}")
+
+
+# the start time lives on the statement's execution context, not the pooled
+# connection, so a statement that raises cannot leave a stale entry behind
+def _before(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_start = time.perf_counter()
+
+
+def _after(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_query_start", None)
+    _record_statement(statement, (time.perf_counter() - start) * 1000 if start else 0.0)
+
+
+def _on_error(exception_context):
+    """Failed statements (e.g. IntegrityError on a duplicate) never reach after_cursor_execute."""
+    context = exception_context.execution_context
+    start = getattr(context, "_query_start", None)
+    if start is None:
+        return  # failed before the statement was sent (connect, compile)
+    context._query_start = None
+    _record_statement(exception_context.statement or "", (time.perf_counter() - start) * 1000, failed=True)
+
+
+def instrument(engine):
+    """Attach the counters to an Engine (pass async_engine.sync_engine for the async one)."""
+    event.listen(engine, "before_cursor_execute", _before)
+    event.listen(engine, "after_cursor_execute", _after)
+    event.listen(engine, "handle_error", _on_error)
+
+
+# -------------------- MIDDLEWARE --------------------
+def _route_name(request: Request) -> str:
+    route = request.scope.get("route")
+    return f"{request.method} {getattr(route, 'path', request.url.path)}"
+
+
+def _record(name: str, stats: dict, total_ms: float):
+    with _lock:
+        agg = routes.setdefault(name, {
+            "requests": 0, "statements": 0, "max_statements": 0,
+            "db_ms": 0.0, "total_ms": 0.0, "slow": 0, "failed": 0,
+        })
+        agg["requests"] += 1
+        agg["statements"] += stats["statements"]
+        agg["max_statements"] = max(agg["max_statements"], stats["statements"])
+        agg["db_ms"] += stats["db_ms"]
+        agg["total_ms"] += total_ms
+        agg["slow"] += stats["slow"]
+        agg["failed"] += stats["failed"]
+
+
+async def sql_metrics_middleware(request: Request, call_next):
+    """
+    Count statements per request and add
+    Server-Timing: db;dur=<ms>;desc="<n> queries", app;dur=<ms>
+    Statements run while a StreamingResponse body is sent are not included.
+    """
+    stats = {"statements": 0, "db_ms": 0.0, "slow": 0, "failed": 0, "route": request.url.path}
+    token = _current.set(stats)
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        _current.reset(token)
+    total_ms = (time.perf_counter() - start) * 1000
+    stats["route"] = _route_name(request)
+    _record(stats["route"], stats, total_ms)
+
+    response.headers["Server-Timing"] = (
+        f'db;dur={stats["db_ms"]:.1f};desc="{stats["statements"]} queries", app;dur={total_ms:.1f}'
+    )
+    response.headers["X-DB-Statements"] = str(stats["statements"])
+    return response
+
+
+# -------------------- /metrics --------------------
+router = APIRouter(tags=["health"])
+
+
+@router.get("/metrics")
+def get_metrics():
+    """Per-route averages (sorted by statements per request) plus the latest slow statements."""
+    with _lock:
+        per_route = [
+            {
+                "route": name,
+                "requests": agg["requests"],
+                "avg_statements": round(agg["statements"] / agg["requests"], 2),
+                "max_statements": agg["max_statements"],
+                "avg_db_ms": round(agg["db_ms"] / agg["requests"], 2),
+                "avg_total_ms": round(agg["total_ms"] / agg["requests"], 2),
+                "slow_statements": agg["slow"],
+                "failed_statements": agg["failed"],
+            }
+            for name, agg in routes.items()
+        ]
+        recent_slow = list(slow_queries)
+        summary = {**totals, "db_ms": round(totals["db_ms"], 2)}
+    per_route.sort(key=lambda r: r["avg_statements"], reverse=True)
+    return {
+        "slow_query_ms": SLOW_QUERY_MS,
+        "totals": summary,
+        "routes": per_route,
+        "slow_queries": recent_slow,
+    }
@@ -0,0 +1,141 @@
+# writes.py
+# Single-statement writes that rely on the table's UNIQUE / FOREIGN KEY
+# constraints instead of SELECT pre-checks. Uses RETURNING when the dialect has
+# it (MariaDB, Postgres, SQLite); on MySQL an insert/update is followed by one
+# SELECT by primary key in the same transaction.
+from contextlib import asynccontextmanager, contextmanager
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+# unique column -> message (same wording the old pre-checks returned)
+UNIQUE_MESSAGES = {"email": "Email already registered", "isbn": "ISBN already exists"}
+
+MYSQL_DUP_ENTRY = 1062
+MYSQL_ROW_IS_REFERENCED = 1451    # delete parent that still has children
+MYSQL_NO_REFERENCED_ROW = 1452    # insert/update child with unknown parent
+
+
+def integrity_http_error(e: IntegrityError, fk_detail: str) -> HTTPException:
+    """Map a constraint violation to the 400 the route used to raise after its pre-check."""
+    text = str(e.orig).lower()
+    args = getattr(e.orig, "args", None)
+    code = args[0] if args else None
+    if code == MYSQL_DUP_ENTRY or "unique" in text or "duplicate" in text:
+        key = text.rsplit("for key", 1)[-1]  # MySQL: "Duplicate entry 'x' for key 'authors.ix_authors_email'"
+        for column, message in UNIQUE_MESSAGES.items():
+            if column in key:
+                return HTTPException(status_code=400, detail=message)
+        return HTTPException(status_code=400, detail="Duplicate value")
+    if code in (MYSQL_ROW_IS_REFERENCED, MYSQL_NO_REFERENCED_ROW) or "foreign key" in text:
+        return HTTPException(status_code=400, detail=fk_detail)
+    return HTTPException(status_code=400, detail=f"Constraint violation: {e.orig}")
+
+
+@contextmanager
+def constraint_errors(db, fk_detail: str = "Author does not exist"):
+    """Roll back and raise the translated 400 if a statement or the commit hits a constraint."""
+    try:
+        yield
+    except IntegrityError as e:
+        db.rollback()
+        raise integrity_http_error(e, fk_detail)
+
+
+@asynccontextmanager
+async def constraint_errors_async(db, fk_detail: str = "Author does not exist"):
+    try:
+        yield
+    except IntegrityError as e:
+        await db.rollback()
+        raise integrity_http_error(e, fk_detail)
+
+
+# -------------------- STATEMENTS --------------------
+def _returning(db) -> tuple:
+    dialect = db.get_bind().dialect
+    return dialect.insert_returning, dialect.update_returning
+
+
+def _select_stmt(model, entity_id: int):
+    table = model.__table__
+    return select(*table.columns).where(table.c.id == entity_id)
+
+
+def _update_stmt(model, entity_id: int, values: dict):
+    table = model.__table__
+    return update(table).where(table.c.id == entity_id).values(**values)
+
+
+def _delete_stmt(model, entity_id: int):
+    table = model.__table__
+    return delete(table).where(table.c.id == entity_id)
+
+
+# -------------------- SYNC SESSION --------------------
+def select_row(db, model, entity_id: int) -> Optional[dict]:
+    row = db.execute(_select_stmt(model, entity_id)).mappings().first()
+    return dict(row) if row else None
+
+
+def insert_row(db, model, values: dict) -> dict:
+    """INSERT one row and return it as a dict (INSERT ... RETURNING, or INSERT + SELECT by id)."""
+    stmt = insert(model.__table__).values(**values)
+    insert_returning, _ = _returning(db)
+    if insert_returning:
+        return dict(db.execute(stmt.returning(*model.__table__.columns)).mappings().one())
+    new_id = db.execute(stmt).inserted_primary_key[0]
+    return select_row(db, model, new_id)
+
+
+def update_row(db, model, entity_id: int, values: dict) -> Optional[dict]:
+    """UPDATE one row by id and return it as a dict, or None if it doesn't exist."""
+    if not values:
+        return select_row(db, model, entity_id)
+    stmt = _update_stmt(model, entity_id, values)
+    _, update_returning = _returning(db)
+    if update_returning:
+        row = db.execute(stmt.returning(*model.__table__.columns)).mappings().first()
+        return dict(row) if row else None
+    if db.execute(stmt).rowcount == 0:  # MySQL dialect counts matched rows, not changed ones
+        return None
+    return select_row(db, model, entity_id)
+
+
+def delete_row(db, model, entity_id: int) -> bool:
+    """DELETE one row by id; False if nothing was deleted."""
+    return db.execute(_delete_stmt(model, entity_id)).rowcount > 0
+
+
+# -------------------- ASYNC SESSION --------------------
+async def select_row_async(db, model, entity_id: int) -> Optional[dict]:
+    row = (await db.execute(_select_stmt(model, entity_id))).mappings().first()
+    return dict(row) if row else None
+
+
+async def insert_row_async(db, model, values: dict) -> dict:
+    stmt = insert(model.__table__).values(**values)
+    insert_returning, _ = _returning(db)
+    if insert_returning:
+        return dict((await db.execute(stmt.returning(*model.__table__.columns))).mappings().one())
+    new_id = (await db.execute(stmt)).inserted_primary_key[0]
+    return await select_row_async(db, model, new_id)
+
+
+async def update_row_async(db, model, entity_id: int, values: dict) -> Optional[dict]:
+    if not values:
+        return await select_row_async(db, model, entity_id)
+    stmt = _update_stmt(model, entity_id, values)
+    _, update_returning = _returning(db)
+    if update_returning:
+        row = (await db.execute(stmt.returning(*model.__table__.columns))).mappings().first()
+        return dict(row) if row else None
+    if (await db.execute(stmt)).rowcount == 0:
+        return None
+    return await select_row_async(db, model, entity_id)
+
+
+async def delete_row_async(db, model, entity_id: int) -> bool:
+    return (await db.execute(_delete_stmt(model, entity_id))).rowcount > 0
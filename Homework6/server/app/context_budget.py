@@ -0,0 +1,161 @@
+# app/context_budget.py
+import os, math
+from typing import Callable, Dict, List, Optional
+
+# configuration
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "2000"))
+TOKENIZER = os.getenv("TOKENIZER", "chars")
+# long_term: fixed share of the whole budget; short_term/episodic split what is left
+SECTION_WEIGHTS = {"long_term": 0.25, "short_term": 0.5, "episodic": 0.25}
+SECTION_OVERHEAD = 8  # headers / separators per section
+
+class CharTokenizer:
+    """Cheap approximation: ~4 characters per token."""
+    chars_per_token = 4
+
+    def count(self, text: str) -> int:
+        return math.ceil(len(text) / self.chars_per_token) if text else 0
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        return text[:max(0, max_tokens) * self.chars_per_token]
+
+class TiktokenTokenizer:
+    """Exact BPE counts via tiktoken (optional dependency)."""
+
+    def __init__(self, encoding: str = "cl100k_base"):
+        import tiktoken
+        self._enc = tiktoken.get_encoding(encoding)
+
+    def count(self, text: str) -> int:
+        return len(self._enc.encode(text)) if text else 0
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        return self._enc.decode(self._enc.encode(text)[:max(0, max_tokens)])
+
+_factories: Dict[str, Callable[[], object]] = {
+    "chars": CharTokenizer,
+    "tiktoken": TiktokenTokenizer,
+}
+_tokenizer = None
+
+def register_tokenizer(name: str, factory: Callable[[], object]):
+    """Plug in another tokenizer (anything with count(text) and truncate(text, n))."""
+    _factories[name] = factory
+
+def get_tokenizer():
+    global _tokenizer
+    if _tokenizer is None:
+        try:
+            _tokenizer = _factories[TOKENIZER]()
+        except Exception as e:
+            print(f"Tokenizer '{TOKENIZER}' unavailable ({e}), using char estimate")
+            _tokenizer = CharTokenizer()
+    return _tokenizer
+
+def allocate(needs: Dict[str, int], available: int, weights: Dict[str, float] = SECTION_WEIGHTS) -> Dict[str, int]:
+    """
+    Split `available` tokens across sections by weight; sections that need
+    less than their share keep only what they need and the slack is
+    redistributed to the others.
+    """
+    alloc, pending, remaining = {}, set(needs), max(0, available)
+    while pending:
+        total_w = sum(weights[s] for s in pending)
+        fair = {s: remaining * weights[s] / total_w for s in pending}
+        satisfied = [s for s in pending if needs[s] <= fair[s]]
+        if not satisfied:
+            alloc.update({s: int(fair[s]) for s in pending})
+            break
+        for s in satisfied:
+            alloc[s] = needs[s]
+            remaining -= needs[s]
+            pending.discard(s)
+    return alloc
+
+def _first_kept(costs: List[int], limit: int, step: int = 1) -> int:
+    """
+    Index of the oldest message kept so that costs[index:] fits in `limit`:
+    drops the oldest `step` messages at a time, then single messages once
+    fewer than a whole step would remain.
+    """
+    start, total = 0, sum(costs)
+    while start < len(costs) and total > limit:
+        drop = step if len(costs) - start > step else 1
+        total -= sum(costs[start:start + drop])
+        start += drop
+    return start
+
+def fit_context(
+    message: str,
+    short_term_msgs: list,
+    long_term_summary: Optional[str],
+    episodes: List[str],
+    budget: int = PROMPT_TOKEN_BUDGET,
+    step: int = 1,
+) -> dict:
+    """
+    Fit the memory sections into the prompt budget:
+    - long-term summary is truncated to a fixed cap (its share of the whole
+      budget), so the same summary always renders the same and the cached
+      prompt prefix it starts survives from turn to turn,
+    - short-term drops the oldest messages first, `step` at a time (the
+      stepped short-term window of messages mode) so the window keeps its start,
+    - episodes (ranked by relevance) drop from the bottom.
+    Short-term and episodic split what the summary and message leave, and
+    short-term passes its unused share on to episodic.
+    `short_term_msgs` must not include `message` itself.
+    Returns the trimmed sections and a token breakdown.
+    """
+    tok = get_tokenizer()
+    message_tokens = tok.count(message)
+    msg_costs = [tok.count(f"{m['role']}: {m['content']}") for m in short_term_msgs]
+    fact_costs = [tok.count(f) + 1 for f in episodes]
+    summary_cost = tok.count(long_term_summary or "")
+
+    # long-term: fixed cap, independent of this turn's other sections
+    summary, lt_used = long_term_summary, summary_cost + SECTION_OVERHEAD if summary_cost else 0
+    lt_cap = min(int(budget * SECTION_WEIGHTS["long_term"]), budget - message_tokens)
+    if summary and lt_used > lt_cap:
+        keep = lt_cap - SECTION_OVERHEAD
+        summary = tok.truncate(summary, keep) if keep > 0 else None
+        lt_used = tok.count(summary) + SECTION_OVERHEAD if summary else 0
+
+    needs = {
+        "short_term": sum(msg_costs) + SECTION_OVERHEAD if msg_costs else 0,
+        "episodic": sum(fact_costs) + SECTION_OVERHEAD if fact_costs else 0,
+    }
+    alloc = allocate(needs, budget - message_tokens - lt_used)
+
+    # short-term: keep the newest messages that fit
+    first = _first_kept(msg_costs, alloc["short_term"] - SECTION_OVERHEAD, max(1, step))
+    kept = short_term_msgs[first:]
+    st_used = sum(msg_costs[first:]) + SECTION_OVERHEAD if kept else 0
+    spare = alloc["short_term"] - st_used  # whole messages rarely fill the share exactly
+
+    # episodic: keep the most relevant facts that fit (own share + short-term leftover)
+    facts, ep_used = [], SECTION_OVERHEAD if fact_costs else 0
+    ep_budget = alloc["episodic"] + spare
+    for f, cost in zip(episodes, fact_costs):
+        if ep_used + cost > ep_budget:
+            break
+        facts.append(f)
+        ep_used += cost
+    if not facts:
+        ep_used = 0
+
+    return {
+        "short_term_msgs": kept,
+        "long_term_summary": summary,
+        "episodes": facts,
+        "token_usage": {
+            "budget": budget,
+            "message": message_tokens,
+            "long_term": lt_used,
+            "short_term": st_used,
+            "episodic": ep_used,
+            "total": message_tokens + lt_used + st_used + ep_used,
+            "dropped_messages": len(short_term_msgs) - len(kept),
+            "dropped_facts": len(episodes) - len(facts),
+            "truncated_summary_tokens": max(0, summary_cost + SECTION_OVERHEAD - lt_used) if long_term_summary else 0,
+        },
+    }
@@ -0,0 +1,226 @@
+# app/episode_index.py
+import os, asyncio, hashlib
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Tuple
+import numpy as np
+from pymongo import UpdateOne
+from .db import db
+from .ollama import embed, OLLAMA_EMBED_MODEL
+
+# configuration
+EPISODE_INDEX_MAX_USERS = int(os.getenv("EPISODE_INDEX_MAX_USERS", "256"))
+INITIAL_CAPACITY = 64
+EPISODE_QUERY_CACHE_SIZE = int(os.getenv("EPISODE_QUERY_CACHE_SIZE", "1024"))
+
+EPISODES = db["episodes"]
+
+def _normalize(mat: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(mat, axis=-1, keepdims=True)
+    return mat / np.maximum(norms, 1e-12)
+
+class UserVectorIndex:
+    """
+    Unit-normalized float32 embedding matrix for one user's episodes.
+    Rows are appended in place (capacity doubles when full), and cosine
+    top-k is a single matrix-vector product over the filled rows.
+    """
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.size = 0
+        self._mat = np.zeros((INITIAL_CAPACITY, dim), dtype=np.float32)
+        self.facts: List[str] = []
+        self._ids = set()
+
+    def add(self, ids: list, facts: List[str], vectors: List[List[float]]):
+        rows = [(i, f, v) for i, f, v in zip(ids, facts, vectors)
+                if i not in self._ids and len(v) == self.dim]
+        if not rows:
+            return
+        new = _normalize(np.asarray([v for _, _, v in rows], dtype=np.float32))
+        needed = self.size + len(rows)
+        if needed > len(self._mat):
+            capacity = len(self._mat)
+            while capacity < needed:
+                capacity *= 2
+            grown = np.zeros((capacity, self.dim), dtype=np.float32)
+            grown[:self.size] = self._mat[:self.size]
+            self._mat = grown
+        self._mat[self.size:needed] = new
+        self.size = needed
+        for i, f, _ in rows:
+            self._ids.add(i)
+            self.facts.append(f)
+
+    def search(self, query: List[float], k: int) -> List[Tuple[str, float]]:
+        if self.size == 0 or len(query) != self.dim:
+            return []
+        q = _normalize(np.asarray(query, dtype=np.float32))
+        scores = self._mat[:self.size] @ q
+        k = min(k, self.size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.facts[i], float(scores[i])) for i in top]
+
+class EpisodeIndexCache:
+    """Per-user indexes, warmed lazily from Mongo and evicted LRU across users."""
+
+    def __init__(self, max_users: int = EPISODE_INDEX_MAX_USERS):
+        self.max_users = max_users
+        self._indexes: "OrderedDict[str, UserVectorIndex | None]" = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def _lock(self, user_id: str) -> asyncio.Lock:
+        return self._locks.setdefault(user_id, asyncio.Lock())
+
+    async def _load(self, user_id: str):
+        cursor = EPISODES.find(
+            {"user_id": user_id, "embedding.0": {"$exists": True}},
+            {"fact": 1, "embedding": 1},
+        ).sort("created_at", 1)
+        docs = await cursor.to_list(length=None)
+        if not docs:
+            return None
+        index = UserVectorIndex(len(docs[-1]["embedding"]))  # newest model's dimension
+        index.add([d["_id"] for d in docs], [d["fact"] for d in docs], [d["embedding"] for d in docs])
+        return index
+
+    def _put(self, user_id: str, index):
+        self._indexes[user_id] = index
+        self._indexes.move_to_end(user_id)
+        while len(self._indexes) > self.max_users:
+            evicted, _ = self._indexes.popitem(last=False)
+            self._locks.pop(evicted, None)
+
+    async def get(self, user_id: str):
+        """Return the user's index (None if they have no embedded episodes yet)."""
+        if user_id in self._indexes:
+            self._indexes.move_to_end(user_id)
+            return self._indexes[user_id]
+        async with self._lock(user_id):
+            if user_id not in self._indexes:
+                self._put(user_id, await self._load(user_id))
+            return self._indexes[user_id]
+
+    async def add(self, user_id: str, ids: list, facts: List[str], vectors: List[List[float]]):
+        """Append freshly stored episodes if the user's index is already warm."""
+        async with self._lock(user_id):
+            if user_id not in self._indexes:
+                return  # next get() will load them from Mongo
+            index = self._indexes[user_id]
+            if index is None and vectors:
+                index = UserVectorIndex(len(vectors[0]))
+                self._indexes[user_id] = index
+            if index is not None:
+                index.add(ids, facts, vectors)
+
+    def stats(self) -> dict:
+        return {
+            "users": len(self._indexes),
+            "max_users": self.max_users,
+            "vectors": sum(i.size for i in self._indexes.values() if i is not None),
+        }
+
+episode_index = EpisodeIndexCache()
+
+class QueryEmbeddingCache:
+    """LRU of query embeddings keyed by (model, normalized text): a repeated question skips Ollama."""
+
+    def __init__(self, max_size: int = EPISODE_QUERY_CACHE_SIZE):
+        self.max_size = max_size
+        self._cache: "OrderedDict[Tuple[str, str], List[float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    async def embed(self, query: str) -> List[float]:
+        key = (OLLAMA_EMBED_MODEL, " ".join(query.split()))
+        if key in self._cache:
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        self.misses += 1
+        vectors = await embed([key[1]])
+        if not vectors:
+            return []
+        self._cache[key] = vectors[0]
+        while len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+        return vectors[0]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._cache),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+query_cache = QueryEmbeddingCache()
+
+def fact_key(fact: str) -> str:
+    """Dedupe key of a fact: sha1 of its lowercased text, whitespace collapsed, end punctuation dropped."""
+    text = " ".join(fact.lower().split()).rstrip(".!?")
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+async def store_episodes(user_id: str, session_id: str, facts: List[str]):
+    """
+    Embed facts in one batch and insert them as episodes (and into the warm index).
+    Facts the user already has (same fact_key) are skipped before embedding, so
+    repeated extractions do not fill the top-k with copies of one fact; a stored
+    fact whose embedding failed gets it the next time it is extracted.
+    """
+    new = {}
+    for fact in facts:
+        new.setdefault(fact_key(fact), fact)
+    known = {}
+    if new:
+        cursor = EPISODES.find({"user_id": user_id, "fact_hash": {"$in": list(new)}},
+                               {"fact_hash": 1, "fact": 1, "embedding": {"$slice": 1}})
+        known = {d["fact_hash"]: d for d in await cursor.to_list(length=None)}
+        for h, d in known.items():
+            if d.get("embedding"):
+                new.pop(h, None)
+            else:
+                new[h] = d["fact"]  # embed the stored wording
+    if not new:
+        return
+    hashes, texts = list(new), list(new.values())
+    try:
+        vectors = await embed(texts, priority="extraction")
+        if len(vectors) != len(texts):
+            raise RuntimeError(f"expected {len(texts)} embeddings, got {len(vectors)}")
+    except Exception as e:
+        # keep the facts; they still show up in recency-based fallbacks
+        print(f"Episode embedding error: {e}")
+        vectors = [[] for _ in texts]
+    now = datetime.utcnow()
+    ops = []
+    for h, fact, vec in zip(hashes, texts, vectors):
+        on_insert = {"session_id": session_id, "fact": fact, "importance": 0.5, "created_at": now}
+        update = {"$setOnInsert": on_insert}
+        if vec:
+            update["$set"] = {"embedding": vec}
+        else:
+            on_insert["embedding"] = []
+        ops.append(UpdateOne({"user_id": user_id, "fact_hash": h}, update, upsert=True))
+    # upserts on the unique (user_id, fact_hash) key: a concurrent job storing the same fact is a no-op
+    res = await EPISODES.bulk_write(ops, ordered=False)
+    embedded = [
+        (res.upserted_ids.get(n) or known[h]["_id"], fact, vec)
+        for n, (h, fact, vec) in enumerate(zip(hashes, texts, vectors))
+        if vec and (n in res.upserted_ids or h in known)
+    ]
+    if embedded:
+        ids, fs, vs = zip(*embedded)
+        await episode_index.add(user_id, list(ids), list(fs), list(vs))
+
+async def search_episodes(user_id: str, query: str, k: int) -> List[Tuple[str, float]]:
+    """Cosine top-k episodes for query; empty if the user has no embedded episodes."""
+    index = await episode_index.get(user_id)
+    if index is None or index.size == 0:
+        return []
+    qv = await query_cache.embed(query)
+    return index.search(qv, k) if qv else []
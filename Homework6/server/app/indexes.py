@@ -0,0 +1,206 @@
+# app/indexes.py
+"""
+Index bootstrap + query-plan check for the memory collections.
+
+    python -m app.indexes            # create indexes, then explain hot queries
+    python -m app.indexes --explain  # only explain (no index changes)
+
+Creating the indexes first runs dedupe_summaries(), so databases written
+before summaries were upserted can take the unique summaries index.
+"""
+import sys, asyncio
+from datetime import datetime
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from .db import db
+
+# Compound indexes backing every hot query (equality fields first, sort key last)
+INDEXES = {
+    "messages": [
+        IndexModel([("user_id", ASCENDING), ("session_id", ASCENDING), ("created_at", DESCENDING)],
+                   name="user_session_created"),
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)],
+                   name="user_created"),
+    ],
+    "summaries": [
+        IndexModel([("user_id", ASCENDING), ("scope", ASCENDING), ("session_id", ASCENDING)],
+                   name="user_scope_session", unique=True),  # one current summary per key (upserts)
+        IndexModel([("user_id", ASCENDING), ("scope", ASCENDING), ("session_id", ASCENDING), ("created_at", DESCENDING)],
+                   name="user_scope_session_created"),
+        IndexModel([("user_id", ASCENDING), ("scope", ASCENDING), ("created_at", DESCENDING)],
+                   name="user_scope_created"),
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)],
+                   name="user_created"),
+    ],
+    "episodes": [
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)],
+                   name="user_created"),
+        # dedupe key of store_episodes; episodes stored before it have no fact_hash
+        IndexModel([("user_id", ASCENDING), ("fact_hash", ASCENDING)], name="user_fact_hash", unique=True,
+                   partialFilterExpression={"fact_hash": {"$exists": True}}),
+    ],
+    "memories": [
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)],
+                   name="user_created"),
+        IndexModel([("user_id", ASCENDING), ("tags", ASCENDING), ("created_at", DESCENDING)],
+                   name="user_tags_created"),
+    ],
+    "sessions": [
+        IndexModel([("user_id", ASCENDING), ("session_id", ASCENDING)],
+                   name="user_session", unique=True),
+        IndexModel([("user_id", ASCENDING), ("last_activity", DESCENDING)],
+                   name="user_last_activity"),
+    ],
+    "jobs": [
+        IndexModel([("status", ASCENDING), ("created_at", ASCENDING)],
+                   name="status_created"),
+    ],
+}
+
+# Representative shapes of the queries issued by the routers (values are placeholders)
+_U, _S = "__explain__", "default"
+HOT_QUERIES = [
+    {"name": "chat.short_term", "coll": "messages",
+     "filter": {"user_id": _U, "session_id": _S}, "sort": [("created_at", -1)], "limit": 8},
+    {"name": "chat.session_state", "coll": "sessions",
+     "filter": {"user_id": _U, "session_id": _S}},
+    {"name": "chat.session_summary", "coll": "summaries",
+     "filter": {"user_id": _U, "session_id": _S, "scope": "session"}, "sort": [("created_at", -1)], "limit": 1},
+    {"name": "chat.lifetime_summary", "coll": "summaries",
+     "filter": {"user_id": _U, "session_id": None, "scope": "user"}, "sort": [("created_at", -1)], "limit": 1},
+    {"name": "chat.recent_episodes", "coll": "episodes",
+     "filter": {"user_id": _U}, "sort": [("created_at", -1)], "limit": 5},
+    {"name": "memory.latest_session_summary", "coll": "summaries",
+     "filter": {"user_id": _U, "scope": "session"}, "sort": [("created_at", -1)], "limit": 1},
+    {"name": "memory.recent_messages", "coll": "messages",
+     "filter": {"user_id": _U, "session_id": _S}, "sort": [("created_at", -1)], "limit": 16},
+    {"name": "aggregate.daily_counts", "coll": "messages",
+     "pipeline": [{"$match": {"user_id": _U}},
+                  {"$group": {"_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}},
+                              "count": {"$sum": 1}}}]},
+    {"name": "aggregate.recent_summaries", "coll": "summaries",
+     "filter": {"user_id": _U}, "sort": [("created_at", -1)], "limit": 5},
+    {"name": "aggregate.sessions", "coll": "sessions",
+     "filter": {"user_id": _U}, "sort": [("last_activity", -1)]},
+    {"name": "memories.list", "coll": "memories",
+     "filter": {"user_id": _U}, "sort": [("created_at", -1)], "limit": 50},
+]
+
+async def dedupe_summaries() -> int:
+    """
+    Migration for the unique user_scope_session index: summaries used to get a
+    new document on every fold, so keep only the newest per (user_id, scope,
+    session_id) and move the older ones to summary_history. Returns how many moved.
+    """
+    pipeline = [
+        {"$sort": {"created_at": -1, "_id": -1}},
+        {"$group": {
+            # missing and null session_id are the same key for the unique index
+            "_id": {"user_id": "$user_id", "scope": {"$ifNull": ["$scope", None]},
+                    "session_id": {"$ifNull": ["$session_id", None]}},
+            "ids": {"$push": "$_id"},
+            "n": {"$sum": 1},
+        }},
+        {"$match": {"n": {"$gt": 1}}},
+    ]
+    moved = 0
+    async for group in db["summaries"].aggregate(pipeline, allowDiskUse=True):
+        keep, stale = group["ids"][0], group["ids"][1:]
+        now = datetime.utcnow()
+        docs = await db["summaries"].find({"_id": {"$in": stale}}).to_list(length=None)
+        await db["summary_history"].insert_many([
+            {**{k: v for k, v in d.items() if k != "_id"}, "summary_id": keep, "archived_at": now}
+            for d in docs
+        ])
+        res = await db["summaries"].delete_many({"_id": {"$in": stale}})
+        moved += res.deleted_count
+    return moved
+
+async def ensure_indexes() -> dict:
+    """
+    Create all declared indexes (no-op for ones that already exist), after
+    dedupe_summaries(). Collections are independent: one that fails is
+    reported under "errors" and the others are still indexed.
+    """
+    report = {"created": {}, "errors": {}, "summaries_archived": 0}
+    for coll, models in INDEXES.items():
+        try:
+            if coll == "summaries":
+                report["summaries_archived"] = await dedupe_summaries()
+            report["created"][coll] = await db[coll].create_indexes(models)
+        except Exception as e:
+            report["errors"][coll] = str(e)
+    return report
+
+def _plan_stages(node, out: list):
+    """Collect every 'stage' name under an explain() plan tree."""
+    if isinstance(node, dict):
+        if "stage" in node:
+            out.append(node["stage"])
+        for v in node.values():
+            _plan_stages(v, out)
+    elif isinstance(node, list):
+        for v in node:
+            _plan_stages(v, out)
+    return out
+
+def _winning_plans(node, out: list):
+    if isinstance(node, dict):
+        for k, v in node.items():
+            if k == "winningPlan":
+                out.append(v)
+            else:
+                _winning_plans(v, out)
+    elif isinstance(node, list):
+        for v in node:
+            _winning_plans(v, out)
+    return out
+
+async def explain_query(q: dict) -> dict:
+    if "pipeline" in q:
+        plan = await db.command(
+            "explain", {"aggregate": q["coll"], "pipeline": q["pipeline"], "cursor": {}},
+            verbosity="queryPlanner",
+        )
+    else:
+        cursor = db[q["coll"]].find(q["filter"])
+        if q.get("sort"):
+            cursor = cursor.sort(q["sort"])
+        if q.get("limit"):
+            cursor = cursor.limit(q["limit"])
+        plan = await cursor.explain()
+    stages = []
+    for wp in _winning_plans(plan, []):
+        _plan_stages(wp, stages)
+    return {
+        "query": q["name"],
+        "collection": q["coll"],
+        "stages": stages,
+        "collscan": "COLLSCAN" in stages,
+        "in_memory_sort": "SORT" in stages,
+    }
+
+async def explain_hot_queries() -> dict:
+    results = [await explain_query(q) for q in HOT_QUERIES]
+    return {
+        "ok": not any(r["collscan"] for r in results),
+        "collscans": [r["query"] for r in results if r["collscan"]],
+        "queries": results,
+    }
+
+async def _main(argv):
+    if "--explain" not in argv:
+        report = await ensure_indexes()
+        if report["summaries_archived"]:
+            print(f"summaries: moved {report['summaries_archived']} old versions to summary_history")
+        for coll, names in report["created"].items():
+            print(f"{coll}: {', '.join(names)}")
+        for coll, err in report["errors"].items():
+            print(f"{coll}: FAILED {err}")
+    report = await explain_hot_queries()
+    for r in report["queries"]:
+        flag = "COLLSCAN" if r["collscan"] else "ok"
+        print(f"[{flag:8}] {r['query']:32} {' > '.join(r['stages'])}")
+    return 0 if report["ok"] else 1
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_main(sys.argv[1:])))
@@ -0,0 +1,175 @@
+# app/jobs.py
+import os, time, asyncio
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Optional
+from .db import db
+
+# configuration
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "1000"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_DELAY = float(os.getenv("JOB_RETRY_DELAY", "2"))        # seconds, doubled per attempt
+JOB_ENQUEUE_TIMEOUT = float(os.getenv("JOB_ENQUEUE_TIMEOUT", "1"))  # max wait for a free slot
+JOBS_PERSIST = os.getenv("JOBS_PERSIST", "false").lower() in ("1", "true", "yes")
+
+JOBS = db["jobs"]
+
+_handlers: Dict[str, Callable[..., Awaitable]] = {}
+
+def job_handler(name: str):
+    """Register a coroutine function as the handler for jobs called `name`."""
+    def decorator(fn):
+        _handlers[name] = fn
+        return fn
+    return decorator
+
+class JobQueue:
+    """
+    Bounded in-process asyncio work queue with a fixed pool of workers.
+    - enqueue() waits at most JOB_ENQUEUE_TIMEOUT for a free slot (backpressure),
+      then drops the job instead of stalling the caller.
+    - failed jobs are retried with exponential backoff up to JOB_MAX_ATTEMPTS.
+    - with JOBS_PERSIST, every job is also written to the `jobs` collection and
+      unfinished ones are re-queued on the next startup.
+    """
+
+    def __init__(self, maxsize: int = JOB_QUEUE_SIZE, workers: int = JOB_WORKERS):
+        self.maxsize = maxsize
+        self.num_workers = workers
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: list = []
+        self._retries: set = set()
+        self._waiting: Dict[int, float] = {}  # seq -> enqueue time, for lag
+        self._seq = 0
+        self.in_flight = 0
+        self.stats = {"enqueued": 0, "processed": 0, "failed": 0, "retried": 0, "dropped": 0}
+        self.last_lag_s = 0.0
+
+    async def start(self):
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.num_workers)]
+        if JOBS_PERSIST:
+            await self._recover()
+
+    async def stop(self):
+        tasks = self._workers + list(self._retries)
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+
+    async def enqueue(self, name: str, **kwargs) -> bool:
+        """Queue a job; returns False if it was dropped because the queue stayed full."""
+        if name not in _handlers:
+            raise ValueError(f"Unknown job: {name}")
+        if self._queue is None:
+            await self.start()
+        job = {"name": name, "kwargs": kwargs, "attempts": 0}
+        if JOBS_PERSIST:
+            res = await JOBS.insert_one({
+                **job,
+                "status": "pending",
+                "created_at": datetime.utcnow(),
+            })
+            job["_id"] = res.inserted_id
+        try:
+            await asyncio.wait_for(self._put(job), timeout=JOB_ENQUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.stats["dropped"] += 1
+            print(f"Job queue full, dropped {name}" + (" (kept in db for recovery)" if JOBS_PERSIST else ""))
+            return False
+        self.stats["enqueued"] += 1
+        return True
+
+    async def _put(self, job: dict):
+        self._seq += 1
+        job["seq"] = self._seq
+        self._waiting[job["seq"]] = time.monotonic()
+        try:
+            await self._queue.put(job)
+        except BaseException:  # cancelled by the enqueue timeout
+            self._waiting.pop(job["seq"], None)
+            raise
+
+    async def _recover(self):
+        """Re-queue jobs left pending/running by a previous process."""
+        await JOBS.update_many({"status": "running"}, {"$set": {"status": "pending"}})
+        cursor = JOBS.find({"status": "pending"}).sort("created_at", 1).limit(self.maxsize)
+        recovered = 0
+        async for doc in cursor:
+            if doc["name"] not in _handlers or self._queue.full():
+                continue
+            await self._put({
+                "_id": doc["_id"],
+                "name": doc["name"],
+                "kwargs": doc.get("kwargs", {}),
+                "attempts": doc.get("attempts", 0),
+            })
+            recovered += 1
+        if recovered:
+            print(f"✓ Recovered {recovered} pending jobs")
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            enqueued_at = self._waiting.pop(job.pop("seq", None), None)
+            if enqueued_at is not None:
+                self.last_lag_s = time.monotonic() - enqueued_at
+            self.in_flight += 1
+            try:
+                await self._run(job)
+            except Exception as e:
+                print(f"Job worker error: {repr(e)}")
+            finally:
+                self.in_flight -= 1
+                self._queue.task_done()
+
+    async def _run(self, job: dict):
+        job["attempts"] += 1
+        if job.get("_id") is not None:
+            await JOBS.update_one({"_id": job["_id"]}, {"$set": {"status": "running", "attempts": job["attempts"]}})
+        try:
+            await _handlers[job["name"]](**job["kwargs"])
+        except Exception as e:
+            if job["attempts"] < JOB_MAX_ATTEMPTS:
+                self.stats["retried"] += 1
+                delay = JOB_RETRY_DELAY * 2 ** (job["attempts"] - 1)
+                print(f"Job {job['name']} failed ({e}), retrying in {delay:.0f}s")
+                if job.get("_id") is not None:
+                    await JOBS.update_one({"_id": job["_id"]}, {"$set": {"status": "pending", "error": str(e)}})
+                task = asyncio.create_task(self._retry_later(job, delay))
+                self._retries.add(task)
+                task.add_done_callback(self._retries.discard)
+                return
+            self.stats["failed"] += 1
+            print(f"Job {job['name']} failed permanently: {e}")
+            if job.get("_id") is not None:
+                await JOBS.update_one({"_id": job["_id"]}, {"$set": {"status": "failed", "error": str(e)}})
+            return
+        self.stats["processed"] += 1
+        if job.get("_id") is not None:
+            await JOBS.update_one({"_id": job["_id"]}, {"$set": {"status": "done", "finished_at": datetime.utcnow()}})
+
+    async def _retry_later(self, job: dict, delay: float):
+        await asyncio.sleep(delay)
+        if self._queue is not None:
+            await self._put(job)
+
+    def status(self) -> dict:
+        now = time.monotonic()
+        oldest = min(self._waiting.values(), default=None)
+        return {
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "max_size": self.maxsize,
+            "workers": len(self._workers),
+            "in_flight": self.in_flight,
+            "oldest_wait_s": round(now - oldest, 3) if oldest is not None else 0.0,
+            "last_lag_s": round(self.last_lag_s, 3),
+            "persisted": JOBS_PERSIST,
+            **self.stats,
+        }
+
+job_queue = JobQueue()
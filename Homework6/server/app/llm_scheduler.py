@@ -0,0 +1,150 @@
+# app/llm_scheduler.py
+# Vendored copy of Homework5/llm_scheduler.py: make changes there and copy the
+# file here (server/tests/test_vendored_scheduler.py fails when the two differ).
+import os, time, heapq, asyncio
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+# Priority classes, most urgent first
+PRIORITIES = {"interactive": 0, "extraction": 1, "summarization": 2}
+
+def _parse_map(raw: str, cast=int) -> Dict[str, float]:
+    """'llama3:8b=2,nomic-embed-text=8' -> {"llama3:8b": 2, "nomic-embed-text": 8}"""
+    out = {}
+    for part in filter(None, (p.strip() for p in raw.split(","))):
+        key, _, value = part.rpartition("=")
+        out[key.strip()] = cast(value)
+    return out
+
+# configuration
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "2"))                     # per model, default
+LLM_MODEL_CONCURRENCY = _parse_map(os.getenv("LLM_MODEL_CONCURRENCY", ""))   # per-model overrides
+LLM_QUEUE_LIMITS = {"interactive": 16, "extraction": 64, "summarization": 64,
+                    **_parse_map(os.getenv("LLM_QUEUE_LIMITS", ""))}         # waiting requests per class
+LLM_MAX_WAIT = {"interactive": 30.0, "extraction": 300.0, "summarization": 600.0,
+                **_parse_map(os.getenv("LLM_MAX_WAIT", ""), float)}         # seconds in queue before shedding
+
+class Overloaded(Exception):
+    """Request shed by admission control; retry after `retry_after` seconds (HTTP 429)."""
+
+    def __init__(self, model: str, priority: str, reason: str, retry_after: float):
+        super().__init__(f"{model} overloaded ({reason}) for {priority} requests")
+        self.model = model
+        self.priority = priority
+        self.reason = reason
+        self.retry_after = retry_after
+
+class _Lane:
+    """Slots and waiting requests of one model."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self.waiters = []            # heap of (priority, seq, future)
+        self.queued = {p: 0 for p in PRIORITIES}
+        self.service_s = 5.0         # EWMA of how long a slot is held
+        self.stats = {p: {"admitted": 0, "shed": 0, "timed_out": 0, "wait_ms_total": 0.0, "wait_ms_max": 0.0}
+                      for p in PRIORITIES}
+
+    def retry_after(self) -> float:
+        """Rough time until a queued request would start: queue length x service time / slots."""
+        backlog = len(self.waiters) + 1
+        return max(1.0, round(backlog * self.service_s / self.limit, 1))
+
+class LLMScheduler:
+    """
+    Per-model concurrency limit with priority queues in front of the LLM
+    client. Interactive requests always start before queued background work;
+    when a class's queue is full, or a request waits longer than its max wait,
+    it is rejected with Overloaded instead of piling up behind Ollama's timeouts.
+    """
+
+    def __init__(self):
+        self._lanes: Dict[str, _Lane] = {}
+        self._seq = 0
+
+    def _lane(self, model: str) -> _Lane:
+        lane = self._lanes.get(model)
+        if lane is None:
+            lane = self._lanes[model] = _Lane(int(LLM_MODEL_CONCURRENCY.get(model, LLM_CONCURRENCY)))
+        return lane
+
+    def check_admission(self, model: str, priority: str = "interactive"):
+        """Raise Overloaded now if a request of this class would be shed (e.g. before starting a stream)."""
+        lane = self._lane(model)
+        if lane.active >= lane.limit and lane.queued[priority] >= LLM_QUEUE_LIMITS[priority]:
+            lane.stats[priority]["shed"] += 1
+            raise Overloaded(model, priority, "queue full", lane.retry_after())
+
+    def _release(self, lane: _Lane):
+        # hand the slot straight to the most urgent live waiter
+        while lane.waiters:
+            _, _, fut = heapq.heappop(lane.waiters)
+            if not fut.done():
+                fut.set_result(True)
+                return
+        lane.active -= 1
+
+    @asynccontextmanager
+    async def slot(self, model: str, priority: str = "interactive", max_wait: Optional[float] = None):
+        """Hold one of the model's slots for the duration of the block."""
+        lane = self._lane(model)
+        stats = lane.stats[priority]
+        start = time.monotonic()
+        if lane.active < lane.limit and not lane.waiters:
+            lane.active += 1
+        else:
+            self.check_admission(model, priority)
+            fut = asyncio.get_running_loop().create_future()
+            self._seq += 1
+            entry = (PRIORITIES[priority], self._seq, fut)
+            heapq.heappush(lane.waiters, entry)
+            lane.queued[priority] += 1
+            try:
+                await asyncio.wait_for(asyncio.shield(fut), max_wait or LLM_MAX_WAIT[priority])
+            except BaseException as e:
+                if fut.done() and not fut.cancelled():
+                    self._release(lane)  # slot was handed over just as we gave up
+                else:
+                    fut.cancel()
+                    lane.waiters.remove(entry)
+                    heapq.heapify(lane.waiters)
+                if isinstance(e, asyncio.TimeoutError):
+                    stats["timed_out"] += 1
+                    raise Overloaded(model, priority, "queue wait timeout", lane.retry_after())
+                raise
+            finally:
+                lane.queued[priority] -= 1
+        waited_ms = (time.monotonic() - start) * 1000
+        stats["admitted"] += 1
+        stats["wait_ms_total"] += waited_ms
+        stats["wait_ms_max"] = max(stats["wait_ms_max"], waited_ms)
+        held = time.monotonic()
+        try:
+            yield
+        finally:
+            lane.service_s = 0.8 * lane.service_s + 0.2 * (time.monotonic() - held)
+            self._release(lane)
+
+    def metrics(self) -> dict:
+        out = {}
+        for model, lane in self._lanes.items():
+            out[model] = {
+                "limit": lane.limit,
+                "active": lane.active,
+                "queued": dict(lane.queued),
+                "avg_service_ms": round(lane.service_s * 1000, 1),
+                "classes": {
+                    p: {
+                        "admitted": s["admitted"],
+                        "shed": s["shed"],
+                        "timed_out": s["timed_out"],
+                        "avg_wait_ms": round(s["wait_ms_total"] / s["admitted"], 1) if s["admitted"] else 0.0,
+                        "max_wait_ms": round(s["wait_ms_max"], 1),
+                    }
+                    for p, s in lane.stats.items()
+                },
+            }
+        return out
+
+scheduler = LLMScheduler()
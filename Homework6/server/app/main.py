@@ -1,8 +1,32 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from .routers import health, memory, chat
+from . import ollama
+from .jobs import job_queue
+from .indexes import ensure_indexes
+from .routers import health, memory, chat, aggregate, jobs, diagnostics
 
-app = FastAPI(title="AI Memory FastAPI", version="1.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # idempotent; the app still starts if Mongo is unreachable (errors are per collection)
+    report = await ensure_indexes()
+    for coll, err in report["errors"].items():
+        print(f"Index bootstrap failed for {coll}: {err}")
+    # shared pooled Ollama client for the lifetime of the worker
+    await ollama.start_client()
+    if ollama.OLLAMA_WARMUP:
+        # load + pin the models in the background so startup isn't blocked
+        warmup = asyncio.create_task(ollama.warm_up())
+    # background pipeline for episode extraction / summarization
+    await job_queue.start()
+    yield
+    if ollama.OLLAMA_WARMUP:
+        warmup.cancel()
+    await job_queue.stop()
+    await ollama.close_client()
+
+app = FastAPI(title="AI Memory FastAPI", version="1.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -14,3 +38,6 @@ app.add_middleware(
 app.include_router(health.router)
 app.include_router(memory.router)
 app.include_router(chat.router)
+app.include_router(aggregate.router)
+app.include_router(jobs.router)
+app.include_router(diagnostics.router)
@@ -1,12 +1,13 @@
 # app/memory_logic.py
-from datetime import datetime
-from ..ollama import generate_sync
-from ..db import db
+from .ollama import generate, OLLAMA_EMBED_MODEL
+from .db import db
+from .summarizer import update_session_summary
+from .episode_index import store_episodes
 
 # configuration
 SHORT_TERM_N = 8
 SUMMARIZE_EVERY = 5
-EMBED_MODEL = "nomic-embed-text"
+EMBED_MODEL = OLLAMA_EMBED_MODEL
 
 async def short_term_window(user_id: str, session_id: str = None, n: int = SHORT_TERM_N):
     """Return last n messages for short-term memory."""
@@ -17,33 +18,12 @@ async def short_term_window(user_id: str, session_id: str = None, n: int = SHORT
     return [m async for m in cur][::-1]
 
 async def summarize_recent(user_id: str, session_id: str = None):
-    """Summarize recent conversation and upsert into summaries."""
-    msgs = await short_term_window(user_id, session_id, n=20)
-    text_block = "\n".join([f"{m['role']}: {m['content']}" for m in msgs])
-    summary_prompt = f"Summarize this conversation briefly in bullet points:\n{text_block}"
-    summary = generate_sync(summary_prompt)
-    await db["summaries"].insert_one({
-        "user_id": user_id,
-        "session_id": session_id,
-        "scope": "session",
-        "text": summary,
-        "created_at": datetime.utcnow(),
-    })
-    return summary
+    """Fold messages since the last checkpoint into the session summary."""
+    return await update_session_summary(user_id, session_id)
 
 async def extract_episodes(user_id: str, session_id: str, message: str):
-    """Extract a few short facts (stub)."""
+    """Extract a few short facts and store them as embedded episodes."""
     prompt = f"Extract up to 3 short factual statements from this text:\n{message}"
-    facts = generate_sync(prompt)
-    for line in facts.split("\n"):
-        fact = line.strip("-• ").strip()
-        if not fact:
-            continue
-        await db["episodes"].insert_one({
-            "user_id": user_id,
-            "session_id": session_id,
-            "fact": fact,
-            "importance": 0.5,
-            "embedding": [],
-            "created_at": datetime.utcnow(),
-        })
+    facts = await generate(prompt, priority="extraction")
+    facts = [line.strip("-• ").strip() for line in facts.split("\n")]
+    await store_episodes(user_id, session_id, [f for f in facts if f])
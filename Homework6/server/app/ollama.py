@@ -1,30 +1,209 @@
 # app/ollama.py
-import os, requests
+import os, json, asyncio
+from typing import AsyncIterator, List, Optional
+import httpx
 from dotenv import load_dotenv
+from .context_budget import get_tokenizer
+from .llm_scheduler import scheduler
 
 load_dotenv()
 
 OLLAMA_BASE = os.getenv("OLLAMA_BASE_URL", "http://127.0.0.1:11434")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3:8b")
+OLLAMA_EMBED_MODEL = os.getenv("OLLAMA_EMBED_MODEL", "nomic-embed-text")
 
-def generate_sync(prompt: str, system: str = "") -> str:
+# Connection pool / concurrency settings
+OLLAMA_MAX_CONCURRENCY = int(os.getenv("OLLAMA_MAX_CONCURRENCY", "32"))
+OLLAMA_MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "64"))
+OLLAMA_KEEPALIVE_CONNECTIONS = int(os.getenv("OLLAMA_KEEPALIVE_CONNECTIONS", "32"))
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "300"))
+
+# Keep models loaded between bursts (Ollama's own default is 5m)
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+OLLAMA_WARMUP = os.getenv("OLLAMA_WARMUP", "true").lower() in ("1", "true", "yes")
+
+USAGE = {
+    "calls": 0,
+    "prompt_tokens_est": 0,
+    "prompt_eval_tokens": 0,
+    "prompt_reused_est": 0,
+    "completion_tokens": 0,
+    "cold_loads": 0,
+}
+
+_client: Optional[httpx.AsyncClient] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+
+def _timeout(seconds: Optional[float] = None) -> httpx.Timeout:
+    return httpx.Timeout(seconds or OLLAMA_TIMEOUT, connect=OLLAMA_CONNECT_TIMEOUT)
+
+async def start_client():
+    """Create the shared pooled client (called once at app startup)."""
+    global _client, _semaphore
+    if _client is None:
+        _client = httpx.AsyncClient(
+            base_url=OLLAMA_BASE,
+            timeout=_timeout(),
+            limits=httpx.Limits(
+                max_connections=OLLAMA_MAX_CONNECTIONS,
+                max_keepalive_connections=OLLAMA_KEEPALIVE_CONNECTIONS,
+            ),
+        )
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(OLLAMA_MAX_CONCURRENCY)
+
+async def close_client():
+    """Close the shared client (called at app shutdown)."""
+    global _client, _semaphore
+    if _client is not None:
+        await _client.aclose()
+    _client = None
+    _semaphore = None
+
+async def _get_client() -> httpx.AsyncClient:
+    # Lazily start if used outside the app lifespan (scripts, shell)
+    if _client is None:
+        await start_client()
+    return _client
+
+def _prompt_messages(prompt: str, system: str) -> List[dict]:
+    return (
+        [{"role": "system", "content": system}] if system.strip() else []
+    ) + [{"role": "user", "content": prompt}]
+
+def _chat_payload(messages: List[dict], stream: bool) -> dict:
+    return {
+        "model": OLLAMA_MODEL,
+        "messages": messages,
+        "stream": stream,
+        "keep_alive": OLLAMA_KEEP_ALIVE,
+    }
+
+def _record_usage(messages: List[dict], j: dict) -> dict:
     """
-    Call Ollama's /api/chat (messages array) instead of /api/generate.
-    This is often more reliable and lets us pass system + user cleanly.
+    Track prompt-cache effectiveness. Ollama's prompt_eval_count only counts
+    prompt tokens it actually had to evaluate; the rest of the (estimated)
+    prompt was served from the KV cache of the previous request.
     """
-    data = {
+    tok = get_tokenizer()
+    prompt_tokens = sum(tok.count(m["content"]) + 4 for m in messages)  # + template overhead
+    evaluated = j.get("prompt_eval_count") or 0
+    reused = max(0, prompt_tokens - evaluated)
+    cold = (j.get("load_duration") or 0) > 1e9  # > 1s in ns: model had to be loaded
+    USAGE["calls"] += 1
+    USAGE["prompt_tokens_est"] += prompt_tokens
+    USAGE["prompt_eval_tokens"] += evaluated
+    USAGE["prompt_reused_est"] += reused
+    USAGE["completion_tokens"] += j.get("eval_count") or 0
+    USAGE["cold_loads"] += int(cold)
+    return {"prompt_est": prompt_tokens, "prompt_eval": evaluated, "prompt_reused": reused}
+
+def usage_stats() -> dict:
+    total = USAGE["prompt_tokens_est"]
+    return {
+        **USAGE,
+        "reuse_ratio": round(USAGE["prompt_reused_est"] / total, 3) if total else 0.0,
         "model": OLLAMA_MODEL,
-        "messages": (
-            [{"role": "system", "content": system}] if system.strip() else []
-        ) + [{"role": "user", "content": prompt}],
-        "stream": False,
+        "keep_alive": OLLAMA_KEEP_ALIVE,
+        "scheduler": scheduler.metrics(),
     }
+
+async def chat(messages: List[dict], timeout: Optional[float] = None, stats: Optional[dict] = None,
+               priority: str = "interactive") -> str:
+    """
+    Call Ollama's /api/chat with a full messages array.
+    Uses the shared pooled client, so slow generations never block the event loop;
+    the call waits for a slot of the model in the scheduler (by `priority`),
+    and at most OLLAMA_MAX_CONCURRENCY calls are in flight at once.
+    Raises llm_scheduler.Overloaded if it is shed. Per-call prompt token counts
+    are written into `stats` if given.
+    """
+    data = _chat_payload(messages, stream=False)
+    client = await _get_client()
     try:
-        r = requests.post(f"{OLLAMA_BASE}/api/chat", json=data, timeout=300)
+        async with scheduler.slot(OLLAMA_MODEL, priority), _semaphore:
+            r = await client.post("/api/chat", json=data, timeout=_timeout(timeout))
         r.raise_for_status()
         j = r.json()
+        usage = _record_usage(messages, j)
+        if stats is not None:
+            stats.update(usage)
         # /api/chat returns {"message": {"role": "...", "content": "..."}, ...}
         msg = j.get("message") or {}
         return (msg.get("content") or "").strip()
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
+        raise RuntimeError(f"Ollama error: {e}")
+
+async def chat_stream(messages: List[dict], timeout: Optional[float] = None, stats: Optional[dict] = None,
+                      priority: str = "interactive") -> AsyncIterator[str]:
+    """
+    Streaming variant of chat(): yields content chunks as Ollama produces them.
+    With "stream": true, /api/chat returns one JSON object per line until {"done": true}.
+    """
+    data = _chat_payload(messages, stream=True)
+    client = await _get_client()
+    try:
+        async with scheduler.slot(OLLAMA_MODEL, priority), _semaphore:
+            async with client.stream("POST", "/api/chat", json=data, timeout=_timeout(timeout)) as r:
+                r.raise_for_status()
+                async for line in r.aiter_lines():
+                    if not line.strip():
+                        continue
+                    j = json.loads(line)
+                    if j.get("error"):
+                        raise RuntimeError(f"Ollama error: {j['error']}")
+                    chunk = (j.get("message") or {}).get("content") or ""
+                    if chunk:
+                        yield chunk
+                    if j.get("done"):
+                        usage = _record_usage(messages, j)  # final object carries the counters
+                        if stats is not None:
+                            stats.update(usage)
+                        break
+    except httpx.HTTPError as e:
+        raise RuntimeError(f"Ollama error: {e}")
+
+async def generate(prompt: str, system: str = "", timeout: Optional[float] = None,
+                   priority: str = "interactive") -> str:
+    """Single-prompt helper around chat() (optional system message + one user message)."""
+    return await chat(_prompt_messages(prompt, system), timeout=timeout, priority=priority)
+
+async def generate_stream(prompt: str, system: str = "", timeout: Optional[float] = None,
+                          priority: str = "interactive") -> AsyncIterator[str]:
+    """Single-prompt helper around chat_stream()."""
+    async for chunk in chat_stream(_prompt_messages(prompt, system), timeout=timeout, priority=priority):
+        yield chunk
+
+async def warm_up():
+    """
+    Load the chat and embedding models ahead of the first request and pin
+    them for OLLAMA_KEEP_ALIVE (an /api/generate call without a prompt only loads the model).
+    """
+    client = await _get_client()
+    for path, data in (
+        ("/api/generate", {"model": OLLAMA_MODEL, "keep_alive": OLLAMA_KEEP_ALIVE}),
+        ("/api/embed", {"model": OLLAMA_EMBED_MODEL, "input": "warm-up", "keep_alive": OLLAMA_KEEP_ALIVE}),
+    ):
+        try:
+            r = await client.post(path, json=data)
+            r.raise_for_status()
+            print(f"✓ Warmed up {data['model']}")
+        except httpx.HTTPError as e:
+            print(f"Warm-up failed for {data['model']}: {e}")
+
+async def embed(texts: List[str], model: Optional[str] = None, timeout: Optional[float] = None,
+                priority: str = "interactive") -> List[List[float]]:
+    """Embed a batch of texts in one call to Ollama's /api/embed."""
+    if not texts:
+        return []
+    data = {"model": model or OLLAMA_EMBED_MODEL, "input": texts, "keep_alive": OLLAMA_KEEP_ALIVE}
+    client = await _get_client()
+    try:
+        async with scheduler.slot(data["model"], priority), _semaphore:
+            r = await client.post("/api/embed", json=data, timeout=_timeout(timeout))
+        r.raise_for_status()
+        # /api/embed returns {"embeddings": [[...], ...]} in input order
+        return r.json().get("embeddings") or []
+    except httpx.HTTPError as e:
         raise RuntimeError(f"Ollama error: {e}")
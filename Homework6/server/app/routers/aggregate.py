@@ -2,13 +2,15 @@
 from fastapi import APIRouter, HTTPException
 from datetime import datetime
 from ..db import db
+from ..session_state import list_session_states
 
 router = APIRouter(prefix="/aggregate", tags=["aggregate"])
 
 @router.get("/{user_id}")
 async def aggregate_user(user_id: str):
     """
-    Return daily message counts + recent summaries for a given user.
+    Return daily message counts + recent summaries for a given user,
+    plus per-session counters and totals from the session-state documents.
     """
     try:
         # --- daily message counts ---
@@ -29,7 +31,20 @@ async def aggregate_user(user_id: str):
             {"_id": 0, "scope": 1, "text": 1, "created_at": 1}
         ).sort("created_at", -1).limit(5).to_list(length=None)
 
-        return {"daily_message_counts": msgs, "recent_summaries": summaries}
+        # --- per-session counters (no message counting) ---
+        sessions = await list_session_states(user_id)
+        totals = {
+            "sessions": len(sessions),
+            "messages": sum(s.get("message_count", 0) for s in sessions),
+            "user_messages": sum(s.get("user_message_count", 0) for s in sessions),
+        }
+
+        return {
+            "daily_message_counts": msgs,
+            "recent_summaries": summaries,
+            "sessions": sessions,
+            "totals": totals,
+        }
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,10 +1,19 @@
 # app/routers/chat.py
+import os, json, time, asyncio
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional
 from datetime import datetime
-from app.ollama import generate_sync
+from app.ollama import generate
+from app import ollama
 from app.db import db
+from app.jobs import job_queue, job_handler
+from app.episode_index import search_episodes, store_episodes, episode_index, query_cache
+from app.session_state import record_message, claim_summary
+from app.context_budget import fit_context
+from app.llm_scheduler import scheduler, Overloaded
+from app import summarizer  # registers the summarize_session / summarize_user jobs
 
 router = APIRouter(prefix="/api/chat", tags=["chat"])
 
@@ -12,6 +21,9 @@ router = APIRouter(prefix="/api/chat", tags=["chat"])
 SHORT_TERM_N = 8
 SUMMARIZE_EVERY = 5
 TOP_K_EPISODES = 5
+# "messages": stable system+summary prefix followed by real turn messages (KV-cache friendly)
+# "flat": single user prompt from build_chat_prompt
+CHAT_PROMPT_MODE = os.getenv("CHAT_PROMPT_MODE", "messages")
 
 class ChatRequest(BaseModel):
     user_id: str
@@ -23,6 +35,8 @@ class ChatResponse(BaseModel):
     short_term_count: int
     long_term_summary: Optional[str] = None
     episodic_facts: list[str] = []
+    timings_ms: dict[str, float] = {}
+    token_usage: dict[str, int] = {}
 
 async def get_short_term_messages(user_id: str, session_id: str, n: int = SHORT_TERM_N):
     """Fetch last N messages for short-term memory."""
@@ -33,17 +47,18 @@ async def get_short_term_messages(user_id: str, session_id: str, n: int = SHORT_
     return msgs[::-1]  # reverse to chronological order
 
 async def get_long_term_summaries(user_id: str, session_id: str):
-    """Fetch session and lifetime summaries."""
-    # Get session summary
-    session_summary = await db["summaries"].find_one(
-        {"user_id": user_id, "session_id": session_id, "scope": "session"},
-        sort=[("created_at", -1)]
-    )
-    
-    # Get lifetime summary
-    lifetime_summary = await db["summaries"].find_one(
-        {"user_id": user_id, "session_id": None, "scope": "user"},
-        sort=[("created_at", -1)]
+    """Fetch session and lifetime summaries (both queries in flight together)."""
+    session_summary, lifetime_summary = await asyncio.gather(
+        # Get session summary
+        db["summaries"].find_one(
+            {"user_id": user_id, "session_id": session_id, "scope": "session"},
+            sort=[("created_at", -1)]
+        ),
+        # Get lifetime summary
+        db["summaries"].find_one(
+            {"user_id": user_id, "session_id": None, "scope": "user"},
+            sort=[("created_at", -1)]
+        ),
     )
     
     summary_text = ""
@@ -55,15 +70,23 @@ async def get_long_term_summaries(user_id: str, session_id: str):
     return summary_text if summary_text else None
 
 async def get_relevant_episodes(user_id: str, message: str, k: int = TOP_K_EPISODES):
-    """Retrieve top-k relevant episodic facts (stub - no embedding search yet)."""
+    """Retrieve top-k episodic facts by embedding similarity to the message."""
+    try:
+        hits = await search_episodes(user_id, message, k)
+        if hits:
+            return [fact for fact, _score in hits]
+    except Exception as e:
+        print(f"Episode search error: {e}")
+    # fallback: no embedded episodes yet (or embedding failed) -> most recent facts
     cursor = db["episodes"].find(
         {"user_id": user_id}
     ).sort("created_at", -1).limit(k)
     episodes = await cursor.to_list(length=k)
     return [ep["fact"] for ep in episodes]
 
+@job_handler("extract_episodes")
 async def extract_and_store_episodes(user_id: str, session_id: str, message: str):
-    """Extract facts from user message and store as episodes."""
+    """Extract facts from user message and store as episodes (runs as a background job)."""
     prompt = f"""Extract up to 3 short, important factual statements from this message.
 Return only the facts, one per line, no numbering or bullets.
 
@@ -71,70 +94,17 @@ Message: {message}
 
 Facts:"""
     
-    try:
-        facts_text = generate_sync(prompt)
-        facts = [f.strip().strip("-•").strip() for f in facts_text.split("\n") if f.strip()]
-        
-        for fact in facts[:3]:  # limit to 3
-            if len(fact) > 10:  # must be meaningful
-                await db["episodes"].insert_one({
-                    "user_id": user_id,
-                    "session_id": session_id,
-                    "fact": fact,
-                    "importance": 0.5,
-                    "embedding": [],  # TODO: add real embeddings
-                    "created_at": datetime.utcnow()
-                })
-    except Exception as e:
-        print(f"Episode extraction error: {e}")
-
-async def should_summarize(user_id: str, session_id: str) -> bool:
-    """Check if we should trigger summarization."""
-    count = await db["messages"].count_documents({
-        "user_id": user_id,
-        "session_id": session_id,
-        "role": "user"
-    })
-    return count > 0 and count % SUMMARIZE_EVERY == 0
-
-async def create_session_summary(user_id: str, session_id: str):
-    """Generate and store session summary."""
-    # Get recent messages for summarization
-    cursor = db["messages"].find(
-        {"user_id": user_id, "session_id": session_id}
-    ).sort("created_at", -1).limit(20)
-    msgs = await cursor.to_list(length=20)
-    msgs = msgs[::-1]
-    
-    if not msgs:
-        return
-    
-    # Build conversation text
-    convo_text = "\n".join([f"{m['role']}: {m['content']}" for m in msgs])
+    # errors propagate so the job queue can retry
+    facts_text = await generate(prompt, priority="extraction")
+    facts = [f.strip().strip("-•").strip() for f in facts_text.split("\n") if f.strip()]
+    facts = [f for f in facts[:3] if len(f) > 10]  # limit to 3, must be meaningful
     
-    # Generate summary
-    summary_prompt = f"""Summarize this conversation in 3-5 concise bullet points.
-Focus on key topics, decisions, and important information.
+    # embedded in one batch and added to the user's vector index
+    await store_episodes(user_id, session_id, facts)
 
-Conversation:
-{convo_text}
-
-Summary (bullet points):"""
-    
-    try:
-        summary = generate_sync(summary_prompt)
-        
-        await db["summaries"].insert_one({
-            "user_id": user_id,
-            "session_id": session_id,
-            "scope": "session",
-            "text": summary,
-            "created_at": datetime.utcnow()
-        })
-        
-        print(f"✓ Created session summary for {user_id}/{session_id}")
-    except Exception as e:
-        print(f"Summarization error: {e}")
+async def should_summarize(user_id: str, session_id: str) -> bool:
+    """Check (and claim) whether SUMMARIZE_EVERY user messages arrived since the last summary."""
+    return await claim_summary(user_id, session_id, SUMMARIZE_EVERY) is not None
 
 def build_chat_prompt(message: str, short_term_msgs: list, long_term_summary: str, episodes: list[str]) -> str:
     """Compose the full prompt with all memory types."""
@@ -159,64 +129,230 @@ def build_chat_prompt(message: str, short_term_msgs: list, long_term_summary: st
     
     return "\n".join(parts)
 
-@router.post("", response_model=ChatResponse)
-async def chat(req: ChatRequest):
-    """Main chat endpoint with short-term, long-term, and episodic memory."""
+SYSTEM_PROMPT = "You are a helpful AI assistant with access to conversation history and context."
+
+def build_chat_messages(message: str, short_term_msgs: list, long_term_summary: str, episodes: list[str]) -> list[dict]:
+    """
+    Compose a prefix-stable messages array: the parts that change least come
+    first (system prompt + long-term summary, then prior turns in order), and
+    the volatile parts (this turn's facts and message) last, so Ollama can
+    reuse the KV cache for everything up to the previous turn.
+    """
+    system = SYSTEM_PROMPT
+    if long_term_summary:
+        system += f"\n\n=== Long-term Memory ===\n{long_term_summary}"
+    messages = [{"role": "system", "content": system}]
+    messages += [{"role": m["role"], "content": m["content"]} for m in short_term_msgs]
+    
+    if episodes:
+        messages.append({"role": "system", "content": f"Relevant facts: {'; '.join(episodes)}"})
+    messages.append({"role": "user", "content": message})
+    return messages
+
+def short_term_window_size(message_count: int, n: int = SHORT_TERM_N) -> int:
+    """
+    In messages mode, slide the short-term window in steps of n instead of
+    one turn at a time: the window starts at a multiple of n and holds
+    between n and 2n-1 messages, so its first messages (and the cached
+    prefix) stay the same for several turns.
+    """
+    if CHAT_PROMPT_MODE != "messages" or message_count <= n:
+        return n
+    start = ((message_count - n) // n) * n
+    return message_count - start
+
+async def _timed(stage: str, coro, timings: dict):
+    """Await coro and record its wall time in timings[stage] (ms)."""
+    t0 = time.perf_counter()
     try:
-        session_id = req.session_id or "default"
-        
-        # 1. Save user message
-        await db["messages"].insert_one({
-            "user_id": req.user_id,
-            "session_id": session_id,
-            "role": "user",
-            "content": req.message,
-            "created_at": datetime.utcnow()
-        })
-        
-        # 2. Get short-term memory
-        short_term_msgs = await get_short_term_messages(req.user_id, session_id)
-        
+        return await coro
+    finally:
+        timings[stage] = round((time.perf_counter() - t0) * 1000, 2)
+
+async def assemble_memory(user_id: str, session_id: str, message: str, timings: dict):
+    """
+    Save the user message and fetch all memory types concurrently, so prompt
+    assembly costs the slowest query rather than the sum of all of them.
+    """
+    async def save_then_short_term():
+        # short-term window must include the message we are answering
+        _, state = await _timed("save_user_message", asyncio.gather(
+            db["messages"].insert_one({
+                "user_id": user_id,
+                "session_id": session_id,
+                "role": "user",
+                "content": message,
+                "created_at": datetime.utcnow()
+            }),
+            record_message(user_id, session_id, "user"),
+        ), timings)
+        n = short_term_window_size(state.get("message_count", 0))
+        return await _timed("short_term", get_short_term_messages(user_id, session_id, n), timings)
+    
+    return await _timed("memory_total", asyncio.gather(
+        # 1-2. Save user message, then get short-term memory
+        save_then_short_term(),
         # 3. Get long-term summaries
-        long_term_summary = await get_long_term_summaries(req.user_id, session_id)
-        
+        _timed("long_term", get_long_term_summaries(user_id, session_id), timings),
         # 4. Get relevant episodic facts
-        episodes = await get_relevant_episodes(req.user_id, req.message)
-        
-        # 5. Build prompt and get LLM response
-        system_prompt = "You are a helpful AI assistant with access to conversation history and context."
+        _timed("episodic", get_relevant_episodes(user_id, message), timings),
+    ), timings)
+
+async def prepare_turn(req: ChatRequest) -> dict:
+    """Save the user message and assemble memory + prompt for this turn."""
+    session_id = req.session_id or "default"
+    timings = {}
+    
+    short_term_msgs, long_term_summary, episodes = await assemble_memory(
+        req.user_id, session_id, req.message, timings
+    )
+    
+    # the window was read after saving the message: it is sent separately, not as history
+    if short_term_msgs and short_term_msgs[-1]["role"] == "user" and short_term_msgs[-1]["content"] == req.message:
+        short_term_msgs = short_term_msgs[:-1]
+    
+    # 5. Fit memory into the token budget, then build prompt
+    step = SHORT_TERM_N if CHAT_PROMPT_MODE == "messages" else 1  # trim in whole window steps
+    ctx = fit_context(req.message, short_term_msgs, long_term_summary, episodes, step=step)
+    short_term_msgs = ctx["short_term_msgs"]
+    long_term_summary = ctx["long_term_summary"]
+    episodes = ctx["episodes"]
+    if CHAT_PROMPT_MODE == "messages":
+        llm_messages = build_chat_messages(req.message, short_term_msgs, long_term_summary, episodes)
+        chat_prompt = "\n".join(f"{m['role']}: {m['content']}" for m in llm_messages)
+    else:
         chat_prompt = build_chat_prompt(req.message, short_term_msgs, long_term_summary, episodes)
-        
-        print("\n--- CHAT PROMPT ---")
-        print(chat_prompt[:500])
-        print("-------------------\n")
-        
-        reply = generate_sync(chat_prompt, system=system_prompt)
-        
-        # 6. Save assistant reply
-        await db["messages"].insert_one({
-            "user_id": req.user_id,
+        llm_messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": chat_prompt},
+        ]
+    
+    print("\n--- CHAT PROMPT ---")
+    print(chat_prompt[:500])
+    print("-------------------\n")
+    
+    return {
+        "session_id": session_id,
+        "short_term_msgs": short_term_msgs,
+        "long_term_summary": long_term_summary,
+        "episodes": episodes,
+        "prompt": chat_prompt,
+        "llm_messages": llm_messages,
+        "timings": timings,
+        "token_usage": ctx["token_usage"],
+    }
+
+async def finish_turn(user_id: str, session_id: str, message: str, reply: str):
+    """Persist the assistant reply and queue episodic / long-term memory updates."""
+    # 6. Save assistant reply
+    await asyncio.gather(
+        db["messages"].insert_one({
+            "user_id": user_id,
             "session_id": session_id,
             "role": "assistant",
             "content": reply,
             "created_at": datetime.utcnow()
-        })
+        }),
+        record_message(user_id, session_id, "assistant"),
+    )
+    
+    # 7. Extract episodes from user message (background job, best effort)
+    await job_queue.enqueue("extract_episodes", user_id=user_id, session_id=session_id, message=message)
+    
+    # 8. Check if summarization is needed (background job, rolls the summary forward)
+    if await should_summarize(user_id, session_id):
+        await job_queue.enqueue("summarize_session", user_id=user_id, session_id=session_id)
+
+def build_chat_response(turn: dict, reply: str) -> ChatResponse:
+    return ChatResponse(
+        reply=reply,
+        short_term_count=len(turn["short_term_msgs"]),
+        long_term_summary=turn["long_term_summary"],
+        episodic_facts=turn["episodes"],
+        timings_ms=turn["timings"],
+        token_usage=turn["token_usage"]
+    )
+
+def overloaded_error(e: Overloaded) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail=f"Model busy, retry in {e.retry_after:.0f}s",
+        headers={"Retry-After": str(int(e.retry_after + 0.999))},
+    )
+
+@router.post("", response_model=ChatResponse)
+async def chat(req: ChatRequest):
+    """Main chat endpoint with short-term, long-term, and episodic memory."""
+    try:
+        # shed before the user message is saved, so a 429 leaves no orphan turn
+        scheduler.check_admission(ollama.OLLAMA_MODEL, "interactive")
+        turn = await prepare_turn(req)
         
-        # 7. Extract episodes from user message (async, best effort)
-        await extract_and_store_episodes(req.user_id, session_id, req.message)
+        reply = await _timed(
+            "generate",
+            ollama.chat(turn["llm_messages"], stats=turn["token_usage"]),
+            turn["timings"],
+        )
         
-        # 8. Check if summarization is needed
-        if await should_summarize(req.user_id, session_id):
-            await create_session_summary(req.user_id, session_id)
+        await finish_turn(req.user_id, turn["session_id"], req.message, reply)
         
-        # 9. Return response
-        return ChatResponse(
-            reply=reply,
-            short_term_count=len(short_term_msgs),
-            long_term_summary=long_term_summary,
-            episodic_facts=episodes
-        )
+        return build_chat_response(turn, reply)
         
+    except Overloaded as e:
+        raise overloaded_error(e)
     except Exception as e:
         print(f"CHAT ERROR: {repr(e)}")
-        raise HTTPException(status_code=500, detail=f"Chat failed: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Chat failed: {str(e)}")
+
+@router.post("/stream")
+async def chat_stream(req: ChatRequest):
+    """
+    Streaming chat endpoint (NDJSON).
+    Emits {"token": "..."} lines as the model generates, then one final line
+    {"done": true, ...ChatResponse fields} once the reply has been saved.
+    Errors after the stream has started are reported as {"error": "..."}.
+    """
+    try:
+        # shed before the stream starts, while a 429 can still be returned
+        scheduler.check_admission(ollama.OLLAMA_MODEL, "interactive")
+        turn = await prepare_turn(req)
+    except Overloaded as e:
+        raise overloaded_error(e)
+    except Exception as e:
+        print(f"CHAT ERROR: {repr(e)}")
+        raise HTTPException(status_code=500, detail=f"Chat failed: {str(e)}")
+    
+    async def ndjson_stream():
+        parts = []
+        t0 = time.perf_counter()
+        try:
+            async for chunk in ollama.chat_stream(turn["llm_messages"], stats=turn["token_usage"]):
+                if not parts:
+                    turn["timings"]["first_token"] = round((time.perf_counter() - t0) * 1000, 2)
+                parts.append(chunk)
+                yield json.dumps({"token": chunk}) + "\n"
+            turn["timings"]["generate"] = round((time.perf_counter() - t0) * 1000, 2)
+            
+            reply = "".join(parts).strip()
+            await finish_turn(req.user_id, turn["session_id"], req.message, reply)
+            
+            final = build_chat_response(turn, reply)
+            yield json.dumps({"done": True, **final.model_dump()}) + "\n"
+        except Exception as e:
+            print(f"CHAT STREAM ERROR: {repr(e)}")
+            yield json.dumps({"error": f"Chat failed: {str(e)}"}) + "\n"
+    
+    return StreamingResponse(ndjson_stream(), media_type="application/x-ndjson")
+
+@router.get("/metrics")
+async def chat_metrics():
+    """
+    Ollama usage since startup: prompt tokens reused from the KV cache vs.
+    re-evaluated, plus per-model scheduler slots, queue lengths and queue waits,
+    and the episode indexes with their query-embedding cache.
+    """
+    return {
+        "prompt_mode": CHAT_PROMPT_MODE,
+        **ollama.usage_stats(),
+        "episodes": {**episode_index.stats(), "query_cache": query_cache.stats()},
+    }
@@ -0,0 +1,27 @@
+# app/routers/diagnostics.py
+from fastapi import APIRouter, HTTPException
+from app.indexes import INDEXES, explain_hot_queries
+from app.db import db
+
+router = APIRouter(prefix="/api/diagnostics", tags=["diagnostics"])
+
+@router.get("/indexes")
+async def index_report():
+    """
+    Declared vs. existing indexes per collection, plus the winning plan
+    of every hot query; any COLLSCAN is listed under "collscans".
+    """
+    try:
+        existing = {}
+        for coll in INDEXES:
+            info = await db[coll].index_information()
+            existing[coll] = sorted(info.keys())
+        declared = {coll: [m.document["name"] for m in models] for coll, models in INDEXES.items()}
+        missing = {
+            coll: [n for n in names if n not in existing[coll]]
+            for coll, names in declared.items()
+            if any(n not in existing[coll] for n in names)
+        }
+        return {"existing": existing, "missing": missing, **(await explain_hot_queries())}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
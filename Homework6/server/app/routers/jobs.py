@@ -0,0 +1,17 @@
+# app/routers/jobs.py
+from fastapi import APIRouter
+from app.jobs import job_queue, JOBS, JOBS_PERSIST
+
+router = APIRouter(prefix="/api/jobs", tags=["jobs"])
+
+@router.get("/status")
+async def jobs_status():
+    """
+    Background pipeline status: queue depth, in-flight jobs, wait/lag
+    and processed/failed/retried/dropped counters.
+    """
+    status = job_queue.status()
+    if JOBS_PERSIST:
+        status["db_pending"] = await JOBS.count_documents({"status": "pending"})
+        status["db_failed"] = await JOBS.count_documents({"status": "failed"})
+    return status
@@ -1,6 +1,7 @@
 # app/routers/memory.py
 from fastapi import APIRouter, HTTPException
 from app.db import db
+from app.session_state import get_session_state
 
 router = APIRouter(prefix="/api/memory", tags=["memory"])
 
@@ -12,6 +13,7 @@ async def get_user_memory(user_id: str):
     - Latest session summary
     - Latest lifetime summary
     - Last 20 episodic facts
+    - Message counters for the default session
     """
     try:
         # Get last 16 messages from default session
@@ -56,8 +58,14 @@ async def get_user_memory(user_id: str):
             for ep in episodes
         ]
         
+        # O(1) counters maintained on every insert
+        state = await get_session_state(user_id, "default") or {}
+        
         return {
             "user_id": user_id,
+            "message_count": state.get("message_count", 0),
+            "user_message_count": state.get("user_message_count", 0),
+            "last_activity": state["last_activity"].isoformat() if state.get("last_activity") else None,
             "last_16_messages": messages_out,
             "session_summary": session_summary["text"] if session_summary else None,
             "lifetime_summary": lifetime_summary["text"] if lifetime_summary else None,
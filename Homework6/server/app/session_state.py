@@ -0,0 +1,91 @@
+# app/session_state.py
+"""
+Per-session counters kept next to the messages collection, so hot paths
+read O(1) state instead of counting messages.
+
+    python -m app.session_state --backfill   # rebuild counters from messages
+"""
+import sys, asyncio
+from datetime import datetime
+from pymongo import ReturnDocument, UpdateOne
+from .db import db
+
+SESSIONS = db["sessions"]
+
+async def record_message(user_id: str, session_id: str, role: str) -> dict:
+    """Atomically bump the session counters for one inserted message; returns the new state."""
+    now = datetime.utcnow()
+    inc = {"message_count": 1}
+    if role == "user":
+        inc["user_message_count"] = 1
+    return await SESSIONS.find_one_and_update(
+        {"user_id": user_id, "session_id": session_id},
+        {
+            "$inc": inc,
+            "$set": {"last_activity": now},
+            "$setOnInsert": {"created_at": now, "summarized_through": 0},
+        },
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+
+async def get_session_state(user_id: str, session_id: str):
+    return await SESSIONS.find_one({"user_id": user_id, "session_id": session_id}, {"_id": 0})
+
+async def list_session_states(user_id: str):
+    cursor = SESSIONS.find({"user_id": user_id}, {"_id": 0}).sort("last_activity", -1)
+    return await cursor.to_list(length=None)
+
+async def claim_summary(user_id: str, session_id: str, every: int):
+    """
+    Move the summary checkpoint up to the current user-message count if at
+    least `every` user messages arrived since the last one. Single atomic
+    update: returns the previous state when this caller won the claim, else
+    None, so concurrent turns never schedule the same summary twice.
+    """
+    return await SESSIONS.find_one_and_update(
+        {
+            "user_id": user_id,
+            "session_id": session_id,
+            "$expr": {"$gte": [
+                {"$subtract": ["$user_message_count", {"$ifNull": ["$summarized_through", 0]}]},
+                every,
+            ]},
+        },
+        [{"$set": {"summarized_through": "$user_message_count", "last_summary_at": "$$NOW"}}],
+        return_document=ReturnDocument.BEFORE,
+    )
+
+async def backfill_sessions() -> int:
+    """Recompute counters for every (user, session) from the messages collection."""
+    pipeline = [
+        {"$group": {
+            "_id": {"user_id": "$user_id", "session_id": "$session_id"},
+            "message_count": {"$sum": 1},
+            "user_message_count": {"$sum": {"$cond": [{"$eq": ["$role", "user"]}, 1, 0]}},
+            "last_activity": {"$max": "$created_at"},
+            "created_at": {"$min": "$created_at"},
+        }},
+    ]
+    ops = []
+    async for g in db["messages"].aggregate(pipeline):
+        ops.append(UpdateOne(
+            {"user_id": g["_id"]["user_id"], "session_id": g["_id"]["session_id"]},
+            {
+                "$set": {
+                    "message_count": g["message_count"],
+                    "user_message_count": g["user_message_count"],
+                    "last_activity": g["last_activity"],
+                    "created_at": g["created_at"],
+                },
+                "$setOnInsert": {"summarized_through": 0},
+            },
+            upsert=True,
+        ))
+    if ops:
+        await SESSIONS.bulk_write(ops, ordered=False)
+    return len(ops)
+
+if __name__ == "__main__":
+    if "--backfill" in sys.argv:
+        print(f"Backfilled {asyncio.run(backfill_sessions())} sessions")
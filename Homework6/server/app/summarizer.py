@@ -0,0 +1,196 @@
+# app/summarizer.py
+import os
+from datetime import datetime
+from typing import Optional
+from pymongo.errors import DuplicateKeyError
+from .db import db
+from .ollama import generate
+from .jobs import job_queue, job_handler
+
+# configuration
+SUMMARY_MAX_NEW_MESSAGES = int(os.getenv("SUMMARY_MAX_NEW_MESSAGES", "40"))  # per fold
+SUMMARY_KEEP_HISTORY = os.getenv("SUMMARY_KEEP_HISTORY", "false").lower() in ("1", "true", "yes")
+SUMMARY_SAVE_ATTEMPTS = int(os.getenv("SUMMARY_SAVE_ATTEMPTS", "3"))  # folds redone when another job saved first
+
+SUMMARIES = db["summaries"]
+HISTORY = db["summary_history"]
+
+def _after_checkpoint(current: Optional[dict]) -> dict:
+    """Messages strictly after the last folded one, ordered by (created_at, _id)."""
+    if not current:
+        return {}
+    if not current.get("through_at"):
+        # summary written before checkpoints existed: covers messages up to its creation
+        return {"created_at": {"$gt": current["created_at"]}}
+    t, last_id = current["through_at"], current.get("through_id")
+    if last_id is None:
+        return {"created_at": {"$gt": t}}
+    return {"$or": [
+        {"created_at": {"$gt": t}},
+        {"created_at": t, "_id": {"$gt": last_id}},
+    ]}
+
+async def _current_summary(query: dict):
+    return await SUMMARIES.find_one(query, sort=[("created_at", -1)])
+
+async def _save_summary(query: dict, current: Optional[dict], text: str, extra: dict) -> bool:
+    """
+    Write the next version of the single current summary for `query`, only if it
+    is still the version that was read (`current`; None = no summary yet), and
+    optionally archive the old version. Returns False if another job saved first:
+    the caller re-reads and redoes its fold instead of overwriting that one.
+    """
+    now = datetime.utcnow()
+    fields = {**extra, "text": text, "created_at": now}  # created_at = time of this version
+    try:
+        if current is None:
+            # unique (user_id, scope, session_id): a concurrent first insert fails here
+            await SUMMARIES.insert_one({**query, **fields, "version": 1})
+        else:
+            # version None also matches summaries written before versions existed
+            res = await SUMMARIES.update_one({"_id": current["_id"], "version": current.get("version")},
+                                             {"$set": fields, "$inc": {"version": 1}})
+            if not res.matched_count:
+                return False
+    except DuplicateKeyError:
+        return False
+    if current and SUMMARY_KEEP_HISTORY:
+        archived = {k: v for k, v in current.items() if k != "_id"}
+        await HISTORY.insert_one({**archived, "summary_id": current["_id"], "archived_at": now})
+    return True
+
+def _save_conflict(query: dict) -> RuntimeError:
+    # raised after SUMMARY_SAVE_ATTEMPTS lost races; the job queue retries the job later
+    return RuntimeError(f"summary {query} changed during {SUMMARY_SAVE_ATTEMPTS} folds")
+
+async def update_session_summary(user_id: str, session_id: Optional[str]) -> Optional[str]:
+    """
+    Fold the messages since the previous checkpoint into the session's
+    current summary (one LLM call over the new messages only).
+    Returns the new summary text, or None if there was nothing new.
+    """
+    fold = await _fold_session(user_id, session_id)
+    return fold["text"] if fold else None
+
+async def _fold_session(user_id: str, session_id: Optional[str]) -> Optional[dict]:
+    """update_session_summary, also returning the folded messages and their checkpoint."""
+    query = {"user_id": user_id, "session_id": session_id, "scope": "session"}
+    for _ in range(SUMMARY_SAVE_ATTEMPTS):
+        current = await _current_summary(query)
+
+        msg_q = {"user_id": user_id, **_after_checkpoint(current)}
+        if session_id is not None:
+            msg_q["session_id"] = session_id
+        cursor = db["messages"].find(
+            msg_q, {"role": 1, "content": 1, "created_at": 1}
+        ).sort([("created_at", 1), ("_id", 1)]).limit(SUMMARY_MAX_NEW_MESSAGES)
+        msgs = await cursor.to_list(length=SUMMARY_MAX_NEW_MESSAGES)
+        if not msgs:
+            return None
+
+        convo_text = "\n".join([f"{m['role']}: {m['content']}" for m in msgs])
+        if current and current.get("text"):
+            prompt = f"""Here is the current summary of a conversation, followed by new messages.
+Rewrite the summary as 3-5 concise bullet points that also cover the new messages.
+Keep key topics, decisions, and important information; drop details that no longer matter.
+
+Current summary:
+{current['text']}
+
+New messages:
+{convo_text}
+
+Updated summary (bullet points):"""
+        else:
+            prompt = f"""Summarize this conversation in 3-5 concise bullet points.
+Focus on key topics, decisions, and important information.
+
+Conversation:
+{convo_text}
+
+Summary (bullet points):"""
+
+        text = await generate(prompt, priority="summarization")
+        if await _save_summary(query, current, text, {
+            "through_at": msgs[-1]["created_at"],
+            "through_id": msgs[-1]["_id"],
+            "messages_folded": (current or {}).get("messages_folded", 0) + len(msgs),
+        }):
+            return {"text": text, "new_messages": convo_text,
+                    "through_at": msgs[-1]["created_at"], "through_id": msgs[-1]["_id"]}
+    raise _save_conflict(query)
+
+def _already_folded(seen: Optional[dict], through_at, through_id) -> bool:
+    """True if a session checkpoint already covers the messages up to (through_at, through_id)."""
+    if not seen or through_at is None or seen.get("through_at") is None:
+        return False
+    if seen["through_at"] != through_at:
+        return seen["through_at"] > through_at
+    return seen.get("through_id") is None or through_id is None or seen["through_id"] >= through_id
+
+async def update_user_summary(user_id: str, new_messages: str, session_id: Optional[str] = None,
+                              through_at: Optional[datetime] = None, through_id=None) -> Optional[str]:
+    """
+    Fold one session's messages since its last fold into the user's lifetime
+    summary (scope "user"). Each session's fold checkpoint (last message folded) is
+    kept on the summary, so a chunk of a session is folded in only once;
+    returns None when it already was (e.g. a retried job). Jobs for other sessions
+    of the same user may fold concurrently: the loser of a save re-reads and folds again.
+    """
+    query = {"user_id": user_id, "session_id": None, "scope": "user"}
+    for _ in range(SUMMARY_SAVE_ATTEMPTS):
+        current = await _current_summary(query)
+        checkpoints = [dict(c) for c in (current or {}).get("session_checkpoints", [])]
+        seen = next((c for c in checkpoints if c["session_id"] == session_id), None)
+        if _already_folded(seen, through_at, through_id):
+            return None
+
+        if current and current.get("text"):
+            prompt = f"""Here is what we know about a user from past conversations, and their newest messages from one session.
+Rewrite it as 3-6 concise bullet points of durable information: who they are,
+preferences, goals and ongoing topics. Drop one-off details.
+
+What we know so far:
+{current['text']}
+
+New messages:
+{new_messages}
+
+Updated profile (bullet points):"""
+        else:
+            prompt = f"""From these conversation messages, write 3-6 concise bullet points of durable
+information about the user: who they are, preferences, goals and ongoing topics.
+
+Messages:
+{new_messages}
+
+Profile (bullet points):"""
+
+        text = await generate(prompt, priority="summarization")
+        mark = {"through_at": through_at, "through_id": through_id}
+        if seen:
+            seen.update(mark)
+        elif through_at is not None:
+            checkpoints.append({"session_id": session_id, **mark})
+        if await _save_summary(query, current, text, {
+            "session_checkpoints": checkpoints,
+            "sessions_folded": len(checkpoints),  # distinct sessions, not folds
+        }):
+            return text
+    raise _save_conflict(query)
+
+@job_handler("summarize_session")
+async def summarize_session_job(user_id: str, session_id: Optional[str]):
+    """Background job: roll the session summary forward, then queue the lifetime update with the new messages."""
+    fold = await _fold_session(user_id, session_id)
+    if fold:
+        print(f"✓ Updated session summary for {user_id}/{session_id}")
+        await job_queue.enqueue("summarize_user", user_id=user_id, session_id=session_id,
+                                new_messages=fold["new_messages"], through_at=fold["through_at"],
+                                through_id=fold["through_id"])
+
+@job_handler("summarize_user")
+async def summarize_user_job(user_id: str, new_messages: str, session_id: Optional[str] = None,
+                             through_at: Optional[datetime] = None, through_id=None):
+    if await update_user_summary(user_id, new_messages, session_id, through_at, through_id):
+        print(f"✓ Updated lifetime summary for {user_id}")
@@ -0,0 +1,25 @@
+# tests/test_vendored_scheduler.py
+"""app/llm_scheduler.py is a copy of Homework5/llm_scheduler.py; fail when they drift apart."""
+import unittest
+from pathlib import Path
+
+REPO = Path(__file__).resolve().parents[3]
+SOURCE = REPO / "Homework5" / "llm_scheduler.py"
+COPY = REPO / "Homework6" / "server" / "app" / "llm_scheduler.py"
+
+def _code(path: Path) -> str:
+    """File contents without the leading comment header (file name / vendoring note)."""
+    lines = path.read_text(encoding="utf-8").splitlines()
+    while lines and lines[0].startswith("#"):
+        lines.pop(0)
+    return "\n".join(lines)
+
+class VendoredSchedulerTest(unittest.TestCase):
+    def test_copy_matches_source(self):
+        self.assertEqual(
+            _code(SOURCE), _code(COPY),
+            f"{COPY.relative_to(REPO)} differs from {SOURCE.relative_to(REPO)}: copy the source over it",
+        )
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+# embedding_pipeline.py
+"""
+Batched, multi-process embedding for corpus ingestion.
+
+EmbeddingPipeline embeds a list of texts in batches of `batch_size` across a
+process pool (one model copy per worker, torch threads split between the
+workers); duplicate texts are embedded once. Use it as the embed_fn of
+EmbeddingStore.add_texts / add_nodes.
+
+StoreEmbedding is a LlamaIndex embed model on top of the store and the
+pipeline, for components that embed on their own (SemanticSplitterNodeParser):
+their vectors are stored by content hash, so re-running or re-splitting with
+other thresholds does not embed the sentence groups again. The splitter's
+sentence groups are not the final chunks, so a collection built from its
+nodes still embeds those chunks itself; only identical texts share a vector.
+"""
+import os, time, multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+
+_model = None  # SentenceTransformer of the current (worker) process
+
+
+def _init_worker(model_name: str, threads: int):
+    global _model
+    import torch
+    from sentence_transformers import SentenceTransformer
+    torch.set_num_threads(threads)
+    _model = SentenceTransformer(model_name, device="cpu")
+
+
+def _encode(batch: List[str]) -> np.ndarray:
+    # normalized, like HuggingFaceEmbedding's default, so vectors match the ones already in the store
+    return _model.encode(batch, batch_size=len(batch), normalize_embeddings=True,
+                         convert_to_numpy=True, show_progress_bar=False).astype(np.float32)
+
+
+class EmbeddingPipeline:
+    def __init__(self, model_name: str = "sentence-transformers/all-MiniLM-L6-v2", batch_size: int = 64,
+                 workers: Optional[int] = None, start_method: str = "spawn"):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.threads = max(1, (os.cpu_count() or 1) // self.workers)  # no oversubscription
+        self.start_method = start_method  # spawn: torch is not fork-safe
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._local = False
+        self.totals = {"calls": 0, "texts": 0, "embedded": 0, "seconds": 0.0}
+
+    @property
+    def round_size(self) -> int:
+        """Texts to hand over per call (e.g. add_texts batch_size) so every worker gets several batches."""
+        return self.batch_size * self.workers * 4
+
+    def _map(self, batches: List[List[str]]):
+        if self.workers == 1:
+            if not self._local:
+                _init_worker(self.model_name, self.threads)
+                self._local = True
+            return map(_encode, batches)
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                self.workers, mp_context=multiprocessing.get_context(self.start_method),
+                initializer=_init_worker, initargs=(self.model_name, self.threads),
+            )
+        return self._pool.map(_encode, batches)
+
+    def __call__(self, texts: List[str]) -> np.ndarray:
+        """(len(texts), dim) float32 vectors, in input order."""
+        t0 = time.perf_counter()
+        unique = list(dict.fromkeys(texts))
+        batches = [unique[i:i + self.batch_size] for i in range(0, len(unique), self.batch_size)]
+        vectors = np.concatenate(list(self._map(batches))) if batches else np.zeros((0, 0), dtype=np.float32)
+        row = {t: i for i, t in enumerate(unique)}
+        out = vectors[[row[t] for t in texts]] if texts else vectors
+
+        self.totals["calls"] += 1
+        self.totals["texts"] += len(texts)
+        self.totals["embedded"] += len(unique)
+        self.totals["seconds"] += time.perf_counter() - t0
+        return out
+
+    def stats(self) -> dict:
+        secs = self.totals["seconds"]
+        return {
+            **self.totals,
+            "seconds": round(secs, 2),
+            "chunks_per_sec": round(self.totals["embedded"] / secs, 1) if secs else 0.0,
+            "workers": self.workers,
+            "batch_size": self.batch_size,
+        }
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class StoreEmbedding(BaseEmbedding):
+    """
+    LlamaIndex embed model that reads text vectors from an EmbeddingStore and
+    embeds only the missing ones with `embed_fn` (an EmbeddingPipeline).
+    Reuse is by exact text: stats() counts how many texts came from the store.
+    Queries go to `query_model` when given, and are not stored.
+    """
+
+    _store = PrivateAttr()
+    _embed_fn = PrivateAttr()
+    _query_model = PrivateAttr()
+    _stats = PrivateAttr()
+
+    def __init__(self, store, embed_fn, query_model=None, embed_batch_size: int = 2048, **kwargs):
+        super().__init__(model_name=store.model_name, embed_batch_size=embed_batch_size, **kwargs)
+        self._store = store
+        self._embed_fn = embed_fn
+        self._query_model = query_model
+        self._stats = {"texts": 0, "from_store": 0}
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "StoreEmbedding"
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        missing = len(self._store.missing(texts))
+        rows = self._store.add_texts(texts, self._embed_fn, getattr(self._embed_fn, "round_size", 256))
+        self._stats["texts"] += len(texts)
+        self._stats["from_store"] += len(set(texts)) - missing
+        return self._store.vectors(rows).tolist()
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embeddings([text])[0]
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        if self._query_model is not None:
+            return self._query_model.get_query_embedding(query)
+        return np.asarray(self._embed_fn([query])[0]).tolist()
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._get_query_embedding(query)
+
+    def stats(self) -> dict:
+        return dict(self._stats)
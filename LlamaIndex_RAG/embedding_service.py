@@ -0,0 +1,61 @@
+# embedding_service.py
+"""
+Query embeddings shared by all retrievers of a model, with an LRU cache keyed
+by (model, normalized text): the same question asked of several indexes, or
+asked again, is embedded once. Cache misses of a call go to the model in a
+single batch.
+"""
+from collections import OrderedDict
+from typing import Callable, List, Sequence, Tuple
+
+import numpy as np
+
+EmbedFn = Callable[[List[str]], Sequence[Sequence[float]]]  # batch of texts -> batch of vectors
+
+
+def normalize_text(text: str) -> str:
+    """Cache key form of a query: surrounding and repeated whitespace removed."""
+    return " ".join(text.split())
+
+
+class EmbeddingService:
+    def __init__(self, embed_fn: EmbedFn, model_name: str, max_size: int = 4096):
+        self.embed_fn = embed_fn
+        self.model_name = model_name
+        self.max_size = max_size
+        self._cache: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0, "batches": 0}
+
+    def _key(self, text: str) -> Tuple[str, str]:
+        return self.model_name, normalize_text(text)
+
+    def embed_many(self, texts: List[str]) -> np.ndarray:
+        """(len(texts), dim) float32 query vectors; one embed_fn call for all uncached texts."""
+        keys = [self._key(t) for t in texts]
+        missing = list(dict.fromkeys(k for k in keys if k not in self._cache))
+        self.counters["misses"] += len(missing)
+        self.counters["hits"] += len(keys) - len(missing)
+        if missing:
+            vectors = np.asarray(self.embed_fn([text for _, text in missing]), dtype=np.float32)
+            self.counters["batches"] += 1
+            self._cache.update(zip(missing, vectors))
+        for k in keys:
+            self._cache.move_to_end(k)
+        out = np.stack([self._cache[k] for k in keys]) if keys else np.zeros((0, 0), dtype=np.float32)
+        while len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+            self.counters["evictions"] += 1
+        return out
+
+    def embed(self, text: str) -> np.ndarray:
+        return self.embed_many([text])[0]
+
+    def stats(self) -> dict:
+        lookups = self.counters["hits"] + self.counters["misses"]
+        return {
+            **self.counters,
+            "hit_rate": round(self.counters["hits"] / lookups, 3) if lookups else 0.0,
+            "size": len(self._cache),
+            "max_size": self.max_size,
+            "model": self.model_name,
+        }
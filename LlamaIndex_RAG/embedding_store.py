@@ -0,0 +1,230 @@
+# embedding_store.py
+"""
+On-disk embedding store for the RAG notebook, so indexes load from disk
+instead of re-embedding the corpus on every run.
+
+Layout (one directory per embed model):
+    <root>/<model>/vectors.npy               float32 or float16 matrix, opened as a memmap
+    <root>/<model>/keys.json                 model, dim, dtype and the content hash of each row
+    <root>/<model>/collections/<name>.jsonl  node sidecar: fingerprint line, then id/text/metadata per node
+    <root>/<model>/collections/<name>.npy    row of each node in vectors.npy
+
+Vectors are keyed by the sha1 of the embedded text: a re-run only embeds
+chunks it has not seen, and a chunk shared by several collections is stored once.
+"""
+import os, re, json, hashlib
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+EmbedFn = Callable[[List[str]], Sequence[Sequence[float]]]  # batch of texts -> batch of vectors
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def fingerprint(source: str, **params) -> str:
+    """Identify one chunking of one corpus (source text + parser settings)."""
+    return content_hash(source + "\0" + json.dumps(params, sort_keys=True, default=str))
+
+
+def _slug(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", name)
+
+
+def _write_json(path: str, data):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def embed_text(node) -> str:
+    """The text LlamaIndex itself would embed for a node (content + embed-visible metadata)."""
+    from llama_index.core.schema import MetadataMode
+    return node.get_content(metadata_mode=MetadataMode.EMBED)
+
+
+class Collection:
+    """The nodes of one chunking of a corpus and the rows of their vectors in the store."""
+
+    def __init__(self, name: str, records: List[dict], rows: np.ndarray, store: "EmbeddingStore", fp: str = ""):
+        self.name = name
+        self.records = records      # [{"id", "text", "metadata"}]
+        self.rows = rows
+        self.store = store
+        self.fingerprint = fp
+        self._matrix = None
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def texts(self) -> List[str]:
+        return [r["text"] for r in self.records]
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """(n_nodes, dim) float32 vectors, read from the memmap on first use."""
+        if self._matrix is None:
+            self._matrix = self.store.vectors(self.rows)
+        return self._matrix
+
+
+class EmbeddingStore:
+    def __init__(self, root: str = "rag_store", model_name: str = "sentence-transformers/all-MiniLM-L6-v2",
+                 dtype: str = "float32"):
+        self.model_name = model_name
+        self.dir = os.path.join(root, _slug(model_name))
+        self.collections_dir = os.path.join(self.dir, "collections")
+        os.makedirs(self.collections_dir, exist_ok=True)
+        self._keys_path = os.path.join(self.dir, "keys.json")
+        self._vectors_path = os.path.join(self.dir, "vectors.npy")
+
+        self.dtype = np.dtype(dtype)
+        self.dim: Optional[int] = None
+        self.hashes: List[str] = []
+        self._mm: Optional[np.memmap] = None
+        if os.path.exists(self._keys_path):
+            with open(self._keys_path, encoding="utf-8") as f:
+                keys = json.load(f)
+            if keys["model"] != model_name:
+                raise ValueError(f"{self.dir} holds vectors of {keys['model']}, not {model_name}")
+            self.dtype = np.dtype(keys["dtype"])  # the file decides, not the argument
+            self.dim = keys["dim"]
+            self.hashes = keys["hashes"]
+            self._mm = np.load(self._vectors_path, mmap_mode="r+")
+        self._row: Dict[str, int] = {h: i for i, h in enumerate(self.hashes)}
+
+    def __len__(self):
+        return len(self.hashes)
+
+    # -------------------- VECTORS --------------------
+    def _reserve(self, extra: int, dim: int):
+        """Make room for `extra` more rows, doubling the file when it is full."""
+        if self.dim is None:
+            self.dim = dim
+        elif dim != self.dim:
+            raise ValueError(f"expected {self.dim}-d vectors, got {dim}")
+        needed = len(self.hashes) + extra
+        capacity = 0 if self._mm is None else self._mm.shape[0]
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, 2 * capacity, 1024)
+        tmp = self._vectors_path + ".tmp"
+        grown = np.lib.format.open_memmap(tmp, mode="w+", dtype=self.dtype, shape=(new_capacity, self.dim))
+        if self._mm is not None:
+            grown[:len(self.hashes)] = self._mm[:len(self.hashes)]
+            del self._mm
+        grown.flush()
+        del grown
+        os.replace(tmp, self._vectors_path)
+        self._mm = np.load(self._vectors_path, mmap_mode="r+")
+
+    def _save_keys(self):
+        self._mm.flush()
+        _write_json(self._keys_path, {
+            "model": self.model_name, "dim": self.dim, "dtype": self.dtype.name, "hashes": self.hashes,
+        })
+
+    def put(self, hashes: List[str], vectors: np.ndarray, save: bool = True) -> np.ndarray:
+        """Store precomputed vectors (skipping hashes already present); returns their rows."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        fresh, seen = [], set()
+        for h, v in zip(hashes, vectors):
+            if h not in self._row and h not in seen:
+                seen.add(h)
+                fresh.append((h, v))
+        if fresh:
+            self._reserve(len(fresh), vectors.shape[1])
+            start = len(self.hashes)
+            self._mm[start:start + len(fresh)] = np.stack([v for _, v in fresh])
+            for i, (h, _) in enumerate(fresh):
+                self._row[h] = start + i
+                self.hashes.append(h)
+            if save:
+                self._save_keys()
+        return np.array([self._row[h] for h in hashes], dtype=np.int64)
+
+    def missing(self, texts: List[str]) -> List[str]:
+        """Texts (deduplicated, in order) whose vectors are not stored yet."""
+        seen, out = set(), []
+        for t in texts:
+            h = content_hash(t)
+            if h not in self._row and h not in seen:
+                seen.add(h)
+                out.append(t)
+        return out
+
+    def add_texts(self, texts: List[str], embed_fn: EmbedFn, batch_size: int = 256) -> np.ndarray:
+        """Rows for `texts`, embedding only those not already in the store."""
+        todo = self.missing(texts)
+        for i in range(0, len(todo), batch_size):
+            batch = todo[i:i + batch_size]
+            self.put([content_hash(t) for t in batch], np.asarray(embed_fn(batch), dtype=np.float32), save=False)
+        if todo:
+            self._save_keys()
+        return np.array([self._row[content_hash(t)] for t in texts], dtype=np.int64)
+
+    def vectors(self, rows: np.ndarray) -> np.ndarray:
+        if self._mm is None:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        return np.asarray(self._mm[rows], dtype=np.float32)
+
+    # -------------------- COLLECTIONS --------------------
+    def collection_base(self, name: str) -> str:
+        """Path prefix of a collection's files (indexes built on it are saved next to them)."""
+        return os.path.join(self.collections_dir, _slug(name))
+
+    def _collection_paths(self, name: str):
+        base = self.collection_base(name)
+        return base + ".jsonl", base + ".npy"
+
+    def save_collection(self, name: str, records: List[dict], rows: np.ndarray, fp: str = "") -> Collection:
+        meta_path, rows_path = self._collection_paths(name)
+        tmp = meta_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"fingerprint": fp, "model": self.model_name, "count": len(records)}) + "\n")
+            for rec in records:
+                f.write(json.dumps(rec, default=str) + "\n")
+        np.save(rows_path, np.asarray(rows, dtype=np.int64))
+        os.replace(tmp, meta_path)  # written last: a collection is only visible once complete
+        return Collection(name, records, np.asarray(rows, dtype=np.int64), self, fp)
+
+    def load_collection(self, name: str, fp: Optional[str] = None) -> Optional[Collection]:
+        """The saved collection, or None if missing or built from a different corpus/parser (fp)."""
+        meta_path, rows_path = self._collection_paths(name)
+        if not (os.path.exists(meta_path) and os.path.exists(rows_path)):
+            return None
+        with open(meta_path, encoding="utf-8") as f:
+            header = json.loads(f.readline())
+            if fp is not None and header["fingerprint"] != fp:
+                return None
+            records = [json.loads(line) for line in f]
+        rows = np.load(rows_path)
+        if len(rows) != len(records) or (len(rows) and rows.max() >= len(self.hashes)):
+            return None
+        return Collection(name, records, rows, self, header["fingerprint"])
+
+    def add_nodes(self, name: str, nodes, embed_fn: EmbedFn, fp: str = "", batch_size: int = 256) -> Collection:
+        """Embed (only new) LlamaIndex nodes and save them as collection `name`."""
+        rows = self.add_texts([embed_text(n) for n in nodes], embed_fn, batch_size)
+        records = [
+            {
+                "id": n.node_id,
+                "text": n.get_content(),
+                "metadata": n.metadata,
+            }
+            for n in nodes
+        ]
+        return self.save_collection(name, records, rows, fp)
+
+    def stats(self) -> dict:
+        return {
+            "model": self.model_name,
+            "vectors": len(self.hashes),
+            "dim": self.dim,
+            "dtype": self.dtype.name,
+            "bytes": 0 if self._mm is None else int(self._mm.nbytes),
+        }
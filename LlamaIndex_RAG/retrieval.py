@@ -0,0 +1,198 @@
+# retrieval.py
+"""
+Cosine top-k over the vectors of an EmbeddingStore collection: exact
+(MatrixRetriever) or approximate with FAISS (FaissRetriever).
+
+Hits carry the stored vector and score of each chunk, so callers never
+re-embed retrieved text; the only embedding per query is the query itself.
+"""
+import os, json, time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:  # optional (requirements.txt): without it FaissRetriever does exact NumPy search
+    import faiss
+except ImportError:
+    faiss = None
+
+# corpus size -> index type for kind="auto"
+FLAT_MAX = 50_000       # exact search is still a few ms per query
+HNSW_MAX = 2_000_000    # graph index: best recall/latency while ~(dim + 2*M) floats per vector fit in RAM
+
+
+def normalize(m: np.ndarray) -> np.ndarray:
+    """L2-normalize rows (or a single vector) as float32."""
+    m = np.asarray(m, dtype=np.float32)
+    norms = np.linalg.norm(m, axis=-1, keepdims=True)
+    return m / np.maximum(norms, 1e-12)
+
+
+def top_k(sims: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Row-wise top-k of a (n_queries, n_items) score matrix, best first: (indices, scores)."""
+    k = min(k, sims.shape[1])
+    if k == 0:
+        empty = np.zeros((sims.shape[0], 0))
+        return empty.astype(np.int64), empty.astype(np.float32)
+    part = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+    part_scores = np.take_along_axis(sims, part, axis=1)
+    order = np.argsort(-part_scores, axis=1)
+    return np.take_along_axis(part, order, axis=1), np.take_along_axis(part_scores, order, axis=1)
+
+
+@dataclass
+class Hit:
+    rank: int
+    index: int              # position of the node in the collection
+    score: float            # cosine similarity to the query
+    vector: np.ndarray      # stored embedding of the node
+    text: str
+    metadata: dict = field(default_factory=dict)
+
+
+class MatrixRetriever:
+    """
+    Brute-force search: one matrix product over the normalized collection matrix.
+    `embedder` (an EmbeddingService) embeds query texts for retrieve_many.
+    """
+
+    def __init__(self, collection, embedder=None):
+        self.collection = collection
+        self.embedder = embedder
+        self.matrix = normalize(collection.matrix)
+
+    def __len__(self):
+        return len(self.collection)
+
+    def search(self, query_vectors: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(indices, scores) of shape (n_queries, k) for one vector or a batch of vectors."""
+        q = normalize(np.atleast_2d(query_vectors))
+        return top_k(q @ self.matrix.T, k)
+
+    def hits(self, indices: np.ndarray, scores: np.ndarray) -> List[Hit]:
+        records = self.collection.records
+        return [
+            Hit(rank=r, index=int(i), score=float(s), vector=self.matrix[i],
+                text=records[i]["text"], metadata=records[i].get("metadata", {}))
+            for r, (i, s) in enumerate(((i, s) for i, s in zip(indices, scores) if i >= 0), 1)
+        ]
+
+    def retrieve(self, query_vector: np.ndarray, k: int = 5) -> List[Hit]:
+        """Top-k hits for an already embedded query."""
+        indices, scores = self.search(query_vector, k)
+        return self.hits(indices[0], scores[0])
+
+    def retrieve_many(self, queries: List[str], k: int = 5) -> List[List[Hit]]:
+        """Top-k hits per query text: one batched embedding, one search over the whole batch."""
+        if self.embedder is None:
+            raise ValueError("retrieve_many needs an embedder (e.g. embedding_service.EmbeddingService)")
+        indices, scores = self.search(self.embedder.embed_many(queries), k)
+        return [self.hits(i, s) for i, s in zip(indices, scores)]
+
+
+# -------------------- FAISS --------------------
+def choose_index_type(n: int) -> str:
+    if n <= FLAT_MAX:
+        return "flat"
+    return "hnsw" if n <= HNSW_MAX else "ivf"
+
+
+class FaissRetriever(MatrixRetriever):
+    """
+    FAISS inner-product index over the normalized collection matrix (so scores are cosines).
+
+    kind: "flat" (exact), "ivf" (clustered, probes `nprobe` of `nlist` lists),
+    "hnsw" (graph, `ef_search` candidates) or "auto" (by corpus size).
+    The index is saved as <collection>.<kind>.faiss next to the collection and
+    rebuilt when the collection or the build parameters change.
+    """
+
+    def __init__(self, collection, kind: str = "auto", nlist: int = 0, nprobe: int = 16,
+                 hnsw_m: int = 32, ef_construction: int = 200, ef_search: int = 64, persist: bool = True,
+                 embedder=None):
+        super().__init__(collection, embedder)
+        n, dim = self.matrix.shape
+        self.kind = choose_index_type(n) if kind == "auto" else kind
+        self.index = None
+        self.build_ms = 0.0
+        if faiss is None:
+            print(f"faiss not installed: {collection.name} uses exact NumPy search")
+            self.kind = "exact"
+            return
+        self.params = {"nlist": nlist or max(1, min(int(4 * np.sqrt(n)), n // 39 or 1)),
+                       "hnsw_m": hnsw_m, "ef_construction": ef_construction}
+        base = collection.store.collection_base(collection.name) + f".{self.kind}"
+        self.path, meta_path = base + ".faiss", base + ".json"
+        meta = {"fingerprint": collection.fingerprint, "count": n, "dim": dim, "params": self.params}
+
+        if persist and os.path.exists(self.path) and os.path.exists(meta_path):
+            with open(meta_path, encoding="utf-8") as f:
+                if json.load(f) == meta:
+                    self.index = faiss.read_index(self.path)
+        if self.index is None:
+            t0 = time.perf_counter()
+            self.index = self._build(dim)
+            self.build_ms = (time.perf_counter() - t0) * 1000
+            if persist:
+                faiss.write_index(self.index, self.path)
+                with open(meta_path, "w", encoding="utf-8") as f:
+                    json.dump(meta, f)
+        self.set_search_params(nprobe=nprobe, ef_search=ef_search)
+
+    def _build(self, dim: int):
+        ip = faiss.METRIC_INNER_PRODUCT
+        if self.kind == "flat":
+            index = faiss.IndexFlatIP(dim)
+        elif self.kind == "ivf":
+            index = faiss.IndexIVFFlat(faiss.IndexFlatIP(dim), dim, self.params["nlist"], ip)
+            index.train(self.matrix)
+        elif self.kind == "hnsw":
+            index = faiss.IndexHNSWFlat(dim, self.params["hnsw_m"], ip)
+            index.hnsw.efConstruction = self.params["ef_construction"]
+        else:
+            raise ValueError(f"unknown index type {self.kind!r} (flat, ivf, hnsw or auto)")
+        index.add(self.matrix)
+        return index
+
+    def set_search_params(self, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+        """Speed/recall knobs, applied at query time (no rebuild)."""
+        if self.kind == "ivf" and nprobe:
+            self.index.nprobe = nprobe
+        if self.kind == "hnsw" and ef_search:
+            self.index.hnsw.efSearch = ef_search
+
+    def search(self, query_vectors: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        if self.index is None:
+            return super().search(query_vectors, k)
+        q = np.ascontiguousarray(normalize(np.atleast_2d(query_vectors)))
+        scores, indices = self.index.search(q, min(k, len(self)))
+        return indices, scores
+
+
+# -------------------- EVALUATION --------------------
+def recall_at_k(retriever, exact: MatrixRetriever, query_vectors: np.ndarray, k: int = 5) -> float:
+    """Mean fraction of the exact top-k that `retriever` also returns."""
+    approx_idx, _ = retriever.search(query_vectors, k)
+    exact_idx, _ = exact.search(query_vectors, k)
+    return float(np.mean([len(set(a[a >= 0]) & set(e)) / len(e) for a, e in zip(approx_idx, exact_idx)]))
+
+
+def compare_retrievers(exact: MatrixRetriever, retrievers: Dict[str, object], query_vectors: np.ndarray,
+                       k: int = 5) -> List[dict]:
+    """recall@k against `exact` and per-query latency (one query at a time) of each retriever."""
+    query_vectors = np.atleast_2d(query_vectors)
+    rows = []
+    for name, r in retrievers.items():
+        t0 = time.perf_counter()
+        for q in query_vectors:
+            r.search(q, k)
+        ms = (time.perf_counter() - t0) * 1000 / len(query_vectors)
+        rows.append({
+            "retriever": name,
+            "kind": getattr(r, "kind", "exact"),
+            f"recall@{k}": round(recall_at_k(r, exact, query_vectors, k), 4),
+            "ms_per_query": round(ms, 3),
+            "build_ms": round(getattr(r, "build_ms", 0.0), 1),
+        })
+    return rows